@@ -1,24 +1,137 @@
+import asyncio
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+import httpx
+import orjson
 import logging
-import subprocess
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Iterator
+
+from src import llm_cache
 
 logger = logging.getLogger(__name__)
 
+_DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant that converts text to well-structured Markdown."
+_DEFAULT_USER_PROMPT_TEMPLATE = "Convert the following text to well-structured Markdown.\n\nText:\n{text_content}"
+_TEXT_PLACEHOLDER = "{text_content}"
+# Stands in for the document text in pre-serialized payload templates
+_PAYLOAD_SENTINEL = b"__T2M_TEXT_CONTENT__"
+
+# Appended to the user prompt template when several documents share one request
+_BATCH_INSTRUCTIONS = (
+    "\n\nThe document content above consists of {count} separate documents, each starting with a "
+    "===DOC n=== marker line. Apply the instructions to each document separately. Return only a JSON "
+    "array of exactly {count} strings, where string n is the Markdown for document n. "
+    "Do not include the markers or any other text."
+)
+_JSON_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+# Seconds to wait for the connection to the API server; the configured api_timeout
+# then only limits the wait for response data, which can be long for big documents.
+_CONNECT_TIMEOUT = 5
+
+# Shared HTTP session, created lazily by _get_session()
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_pool_maxsize = 32 # Connections kept alive per host, see set_connection_pool_size()
+
+def set_connection_pool_size(size: int) -> None:
+    """
+    Sizes the shared session's connection pool, typically to the number of
+    worker threads, so every worker can keep its own connection alive instead
+    of connections being opened and discarded once the pool is full.
+    An already created session is closed and rebuilt on next use.
+    """
+    global _session, _pool_maxsize
+    with _session_lock:
+        _pool_maxsize = size
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def new_async_client(max_connections: int | None = None) -> httpx.AsyncClient:
+    """
+    Creates an httpx.AsyncClient that, like the shared requests session,
+    retries failed connection attempts (httpx itself does not retry on status codes).
+
+    Args:
+        max_connections: Maximum number of simultaneous connections (None for httpx's default).
+
+    Returns:
+        The new client; the caller is responsible for closing it.
+    """
+    if max_connections is None:
+        limits = httpx.Limits()
+    else:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(retries=3, limits=limits))
+
+
+def _get_session() -> requests.Session:
+    """
+    Returns the module-wide requests.Session, creating it on first use.
+    Reusing one session keeps connections to the API server alive between requests
+    instead of opening a new TCP connection for every document.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Retry failed connects and gateway errors, but never a read that
+                # failed midway: the server may already be generating the response.
+                retry = Retry(
+                    total=3,
+                    connect=3,
+                    read=0,
+                    backoff_factor=0.5,
+                    status_forcelist=[502, 503, 504],
+                    allowed_methods=frozenset(["POST", "GET"]),
+                    # Once retries are used up, hand back the last error response so it is
+                    # reported with its status code and body instead of as a RetryError
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=_pool_maxsize, max_retries=retry)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Content-Type'] = 'application/json'
+                _session = session
+    return _session
+
+# Loaded LM Studio models per base URL, as (fetch time, model ids)
+_LOADED_MODELS_TTL = 30.0 # seconds
+_loaded_models_cache: dict[str, tuple[float, list[str]]] = {}
+_loaded_models_lock = threading.Lock()
+
 def get_lmstudio_loaded_models(base_url: str) -> list[str]:
     """
     Get the list of loaded models from LM Studio.
+    Successful lookups are reused for _LOADED_MODELS_TTL seconds, so a batch
+    run does not query /v1/models before every single request.
     """
+    with _loaded_models_lock:
+        cached = _loaded_models_cache.get(base_url)
+    if cached is not None and time.monotonic() - cached[0] < _LOADED_MODELS_TTL:
+        return cached[1]
+
     try:
-        response = requests.get(f"{base_url}/v1/models")
+        response = _get_session().get(f"{base_url}/v1/models")
         if response.status_code == 200:
             data = response.json()
-            return [model['id'] for model in data.get('data', [])]
+            models = [model['id'] for model in data.get('data', [])]
+            with _loaded_models_lock:
+                _loaded_models_cache[base_url] = (time.monotonic(), models)
+            return models
         else:
-            logger.warning(f"Failed to get loaded models: {response.status_code} {response.text}")
+            logger.warning("Failed to get loaded models: %s %s", response.status_code, response.text)
             return []
     except Exception as e:
-        logger.warning(f"Error getting loaded models: {e}")
+        logger.warning("Error getting loaded models: %s", e)
         return []
 
 def load_lmstudio_model(base_url: str, model_name: str, context_length: int = 8192) -> bool:
@@ -26,26 +139,395 @@ def load_lmstudio_model(base_url: str, model_name: str, context_length: int = 81
     Load a model in LM Studio using the CLI.
     Note: Context length should be configured in LM Studio server settings.
     """
+    # Only needed on the rare cold start, so not imported at module level
+    import subprocess
+
     try:
         cmd = ['lms', 'load', model_name]
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
         if result.returncode == 0:
-            logger.info(f"Successfully loaded model {model_name} via CLI")
-            logger.info(f"Note: Ensure context length is set to {context_length} in LM Studio server settings if needed.")
+            with _loaded_models_lock:
+                _loaded_models_cache.pop(base_url, None) # The loaded set just changed
+            logger.info("Successfully loaded model %s via CLI", model_name)
+            logger.info("Note: Ensure context length is set to %s in LM Studio server settings if needed.", context_length)
             return True
         else:
-            logger.error(f"Failed to load model {model_name} via CLI: {result.stderr}")
+            logger.error("Failed to load model %s via CLI: %s", model_name, result.stderr)
             return False
     except subprocess.TimeoutExpired:
-        logger.error(f"Timeout loading model {model_name} via CLI")
+        logger.error("Timeout loading model %s via CLI", model_name)
         return False
     except FileNotFoundError:
         logger.error("LM Studio CLI 'lms' not found. Please ensure LM Studio is installed and 'lms' is in PATH.")
         return False
     except Exception as e:
-        logger.error(f"Error loading model {model_name} via CLI: {e}")
+        logger.error("Error loading model %s via CLI: %s", model_name, e)
         return False
 
+# (base_url, model) pairs already known to be loaded in this process
+_ensured_models: set[tuple[str, str]] = set()
+# (base_url, model) pairs that could not be loaded, with the time.monotonic() of the attempt;
+# not attempted again for _LOADED_MODELS_TTL seconds
+_failed_models: dict[tuple[str, str], float] = {}
+# Serializes the check, so concurrent workers do not each start their own 'lms load'
+_ensure_models_lock = threading.Lock()
+
+def _is_settled(key: tuple[str, str]) -> bool:
+    """
+    Whether the model check for key needs no further work: the model is known to be
+    loaded, or loading it failed less than _LOADED_MODELS_TTL seconds ago.
+    """
+    if key in _ensured_models:
+        return True
+    failed_at = _failed_models.get(key)
+    return failed_at is not None and time.monotonic() - failed_at < _LOADED_MODELS_TTL
+
+def _ensure_lmstudio_model(api_url: str, model_identifier: str, context_length: int) -> None:
+    """
+    Makes sure the requested model is loaded in LM Studio, loading it via the CLI if needed.
+    Once a model is known to be loaded, later calls for it return without any request.
+    Calls made while a check is running wait for it instead of repeating it. If loading
+    fails, calls go ahead without a check for _LOADED_MODELS_TTL seconds, so workers do
+    not queue up behind one failing 'lms load' after another.
+    """
+    base_url = api_url.replace('/v1/chat/completions', '')
+    key = (base_url, model_identifier)
+    if _is_settled(key):
+        return
+    with _ensure_models_lock:
+        if _is_settled(key): # Settled by another worker while this one waited
+            return
+        loaded_models = get_lmstudio_loaded_models(base_url)
+        if model_identifier not in loaded_models:
+            logger.info("Model %s not loaded, attempting to load...", model_identifier)
+            if not load_lmstudio_model(base_url, model_identifier, context_length):
+                logger.warning("Failed to load model %s, proceeding with API call anyway.", model_identifier)
+                _failed_models[key] = time.monotonic()
+                return
+        _failed_models.pop(key, None)
+        _ensured_models.add(key)
+
+def _forget_lmstudio_model(api_url: str, model_identifier: str | None) -> None:
+    """
+    Drops a model from _ensured_models, e.g. after the server reported it as not found
+    (unloaded in the meantime), so the next call checks and loads it again. The cached
+    list of loaded models is dropped as well, as it may still name the model.
+    """
+    if model_identifier:
+        base_url = api_url.replace('/v1/chat/completions', '')
+        _ensured_models.discard((base_url, model_identifier))
+        with _loaded_models_lock:
+            _loaded_models_cache.pop(base_url, None)
+
+@lru_cache(maxsize=16)
+def _split_prompt_template(template: str) -> tuple[str, str] | None:
+    """
+    Splits a user prompt template around its {text_content} placeholder, once per template.
+
+    Returns (prefix, suffix) so the prompt can be built by plain concatenation,
+    or None if the template uses any other str.format syntax (escaped braces,
+    extra fields) and must go through str.format.
+    """
+    if template.count(_TEXT_PLACEHOLDER) != 1:
+        return None
+    prefix, suffix = template.split(_TEXT_PLACEHOLDER)
+    if any(brace in part for part in (prefix, suffix) for brace in '{}'):
+        return None
+    return prefix, suffix
+
+def _build_messages(system_prompt: str, user_content: str) -> list[dict]:
+    """The chat messages of a request: one system and one user message."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+def _build_openai_payload(
+    messages: list[dict],
+    model_identifier: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    context_length: int
+) -> dict:
+    """Chat completion payload for OpenAI-compatible servers (LM Studio)."""
+    payload = {
+        "messages": messages,
+        "temperature": temperature,
+        "stream": True
+    }
+
+    # Only add max_tokens if it's specified
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+
+    if model_identifier: # Check if model_identifier is not None and not empty
+        payload['model'] = model_identifier
+
+    return payload
+
+def _build_ollama_payload(
+    messages: list[dict],
+    model_identifier: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    context_length: int
+) -> dict:
+    """Payload for Ollama's /api/chat endpoint."""
+    return {
+        "model": model_identifier,
+        "messages": messages,
+        "stream": True,
+        "options": {
+            "temperature": temperature,
+            "num_predict": max_tokens if max_tokens else -1,  # Ollama uses -1 for no limit
+            "num_ctx": context_length
+        }
+    }
+
+_PAYLOAD_BUILDERS = {
+    'ollama': _build_ollama_payload,
+    'lmstudio': _build_openai_payload,
+}
+
+@lru_cache(maxsize=16)
+def _payload_template(
+    server_type: str,
+    model_identifier: str | None,
+    system_prompt: str,
+    prompt_prefix: str,
+    prompt_suffix: str,
+    temperature: float,
+    max_tokens: int | None,
+    context_length: int
+) -> bytes | None:
+    """
+    Serializes the parts of the payload that are the same for every document of a
+    run, with _PAYLOAD_SENTINEL where the document text goes in the user message.
+
+    Returns None if the sentinel would be ambiguous because a prompt already contains it.
+    """
+    messages = _build_messages(system_prompt, prompt_prefix + _PAYLOAD_SENTINEL.decode() + prompt_suffix)
+    build_payload = _PAYLOAD_BUILDERS.get(server_type, _build_openai_payload)
+    template = orjson.dumps(build_payload(messages, model_identifier, temperature, max_tokens, context_length))
+    if template.count(_PAYLOAD_SENTINEL) != 1:
+        return None
+    return template
+
+def _prepare_request(
+    text_content: str,
+    server_type: str,
+    api_key: str | None,
+    model_identifier: str | None,
+    system_prompt: str | None,
+    user_prompt_template: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    context_length: int
+) -> tuple[bytes, dict]:
+    """
+    Builds the serialized JSON payload and HTTP headers shared by call_llm_api
+    and acall_llm_api. server_type must already be lower-case.
+    """
+    # Default system prompt if none provided
+    if system_prompt is None:
+        system_prompt = _DEFAULT_SYSTEM_PROMPT
+
+    # Default user prompt template if none provided
+    if user_prompt_template is None:
+        user_prompt_template = _DEFAULT_USER_PROMPT_TEMPLATE
+
+    template_parts = _split_prompt_template(user_prompt_template)
+    payload_template = None
+    if template_parts is not None:
+        payload_template = _payload_template(
+            server_type, model_identifier, system_prompt, template_parts[0], template_parts[1],
+            temperature, max_tokens, context_length
+        )
+
+    if payload_template is not None:
+        # Only the document text needs encoding; orjson.dumps(...)[1:-1] is the
+        # escaped string without its surrounding quotes.
+        body = payload_template.replace(_PAYLOAD_SENTINEL, orjson.dumps(text_content)[1:-1])
+    else:
+        if template_parts is not None:
+            formatted_prompt = template_parts[0] + text_content + template_parts[1]
+        else:
+            formatted_prompt = user_prompt_template.format(text_content=text_content)
+
+        messages = _build_messages(system_prompt, formatted_prompt)
+
+        # Unknown server types fall back to the OpenAI format
+        build_payload = _PAYLOAD_BUILDERS.get(server_type, _build_openai_payload)
+        body = orjson.dumps(build_payload(messages, model_identifier, temperature, max_tokens, context_length))
+
+    # Content-Type is a session default; only per-request headers go here so
+    # different API keys never leak into the shared session.
+    headers = {}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+
+    return body, headers
+
+def _extract_openai_content(response_data: dict) -> str:
+    """Content of an OpenAI-compatible (LM Studio) chat completion response."""
+    return response_data['choices'][0]['message']['content']
+
+def _extract_ollama_content(response_data: dict) -> str:
+    """Content of an Ollama /api/chat response."""
+    return response_data['message']['content']
+
+_CONTENT_EXTRACTORS = {
+    'ollama': _extract_ollama_content,
+    'lmstudio': _extract_openai_content,
+}
+
+def _extract_content(response, server_type: str, api_url: str) -> str | None:
+    """
+    Pulls the Markdown content out of a successful (HTTP 200) API response.
+    Works with both requests and httpx response objects.
+    """
+    # Unknown server types fall back to the OpenAI format, like the payload builder
+    extract = _CONTENT_EXTRACTORS.get(server_type, _extract_openai_content)
+    try:
+        response_data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        logger.error("Could not decode JSON response from %s API at %s. Response text: %s", server_type, api_url, response.text, exc_info=True)
+        return None
+
+    try:
+        markdown_content = extract(response_data).strip()
+    except (KeyError, IndexError, TypeError, AttributeError):
+        logger.error("Unexpected response structure from %s API at %s. Full response: %s", server_type, api_url, response.text)
+        return None
+
+    logger.info("API call to %s API at %s successful, content received.", server_type, api_url)
+    return markdown_content
+
+def _openai_stream_delta(line: str | bytes) -> str | None:
+    """
+    Content delta of one line of an OpenAI-compatible (LM Studio) server-sent event stream.
+    Returns None for lines that carry no text (comments, role-only deltas, [DONE]).
+    """
+    if line[:5] not in (b"data:", "data:"):
+        return None
+    data = line[5:].strip()
+    if data in (b"[DONE]", "[DONE]"):
+        return None
+    choices = orjson.loads(data)['choices']
+    if not choices: # e.g. a trailing usage-only chunk
+        return None
+    return choices[0]['delta'].get('content')
+
+def _ollama_stream_delta(line: str | bytes) -> str | None:
+    """
+    Content delta of one line of an Ollama newline-delimited JSON stream.
+    """
+    return orjson.loads(line)['message']['content']
+
+_STREAM_DELTA_EXTRACTORS = {
+    'ollama': _ollama_stream_delta,
+    'lmstudio': _openai_stream_delta,
+}
+
+def _is_streamed(response) -> bool:
+    """
+    Whether the server answered with a token stream. Servers that ignore
+    "stream": true reply with a single application/json body instead.
+    """
+    return not response.headers.get('Content-Type', '').startswith('application/json')
+
+def _log_stream_error(e: Exception, line: str | bytes, server_type: str, api_url: str) -> None:
+    """
+    Logs a chunk of a response stream that could not be parsed.
+    """
+    if isinstance(e, orjson.JSONDecodeError):
+        logger.error("Could not decode JSON chunk from %s API at %s. Chunk: %r", server_type, api_url, line, exc_info=True)
+    else:
+        logger.error("Unexpected response structure from %s API at %s. Chunk: %r", server_type, api_url, line)
+
+def _join_stream(parts: list[str], chunk_count: int, server_type: str, api_url: str) -> str | None:
+    """
+    Assembles the content deltas of a finished response stream.
+    """
+    if chunk_count == 0:
+        logger.error("Unexpected response structure from %s API at %s. The response stream was empty.", server_type, api_url)
+        return None
+    logger.info("API call to %s API at %s successful, content received.", server_type, api_url)
+    return "".join(parts).strip()
+
+def _check_deadline(deadline: float | None) -> None:
+    """
+    Raises TimeoutError once the time.monotonic() deadline of a response has passed.
+    The read timeout of the HTTP client only limits the wait for each chunk, so a
+    server that keeps streaming (e.g. a model stuck repeating itself) is stopped here.
+    """
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError("The response stream did not finish in time")
+
+def _read_stream(lines, server_type: str, api_url: str, deadline: float | None = None) -> str | None:
+    """
+    Assembles the Markdown content from the lines of a streamed response, chunk by chunk,
+    so the full JSON body is never held in memory.
+    Raises TimeoutError if the stream is still running at the time.monotonic() deadline.
+    """
+    extract_delta = _STREAM_DELTA_EXTRACTORS.get(server_type, _openai_stream_delta)
+    parts = []
+    chunk_count = 0
+    line = b""
+    try:
+        for line in lines:
+            _check_deadline(deadline)
+            if line:
+                chunk_count += 1
+                delta = extract_delta(line)
+                if delta:
+                    parts.append(delta)
+    except (orjson.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError) as e:
+        _log_stream_error(e, line, server_type, api_url)
+        return None
+    return _join_stream(parts, chunk_count, server_type, api_url)
+
+async def _aread_stream(lines, server_type: str, api_url: str, deadline: float | None = None) -> str | None:
+    """
+    Async counterpart of _read_stream for httpx line iterators.
+    """
+    extract_delta = _STREAM_DELTA_EXTRACTORS.get(server_type, _openai_stream_delta)
+    parts = []
+    chunk_count = 0
+    line = ""
+    try:
+        async for line in lines:
+            _check_deadline(deadline)
+            if line:
+                chunk_count += 1
+                delta = extract_delta(line)
+                if delta:
+                    parts.append(delta)
+    except (orjson.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError) as e:
+        _log_stream_error(e, line, server_type, api_url)
+        return None
+    return _join_stream(parts, chunk_count, server_type, api_url)
+
+def _log_connection_error(server_type: str, api_url: str, e: Exception) -> None:
+    """
+    Logs a user-friendly explanation when the API server cannot be reached.
+    """
+    if server_type == 'ollama':
+        server_name = "Ollama"
+    else:
+        server_name = "LM Studio"
+    logger.error(
+        "\n".join((
+            "Cannot connect to %s API at %s",
+            "Please ensure that:",
+            "  1. %s is running",
+            "  2. A model is loaded in %s",
+            "  3. The API server is enabled and listening on %s",
+        )),
+        server_type, api_url, server_name, server_name, api_url
+    )
+    logger.debug("Connection error details: %s", e, exc_info=True)
+
 def call_llm_api(
     text_content: str, 
     api_url: str, 
@@ -57,7 +539,9 @@ def call_llm_api(
     user_prompt_template: str | None = None,
     temperature: float = 0.7,
     max_tokens: int | None = None,
-    context_length: int = 8192
+    context_length: int = 8192,
+    use_cache: bool = False,
+    refresh_cache: bool = False
 ) -> str | None:
     """
     Calls the LLM API (LM Studio or Ollama) to convert text content to Markdown.
@@ -67,128 +551,257 @@ def call_llm_api(
         api_url: The API endpoint URL.
         server_type: 'lmstudio' or 'ollama'
         api_key: Optional API key (for LM Studio).
-        timeout: Timeout for the API request in seconds.
+        timeout: Seconds the whole response may take to arrive, which also limits the
+                 wait for each chunk of it. Connecting is limited to _CONNECT_TIMEOUT
+                 seconds (or timeout, if smaller).
         model_identifier: Optional model identifier to use.
         system_prompt: System prompt for the API. If None, uses a default.
         user_prompt_template: Template for the user prompt, with {text_content} placeholder. If None, uses a default.
         temperature: Temperature for response generation (0.0 to 1.0).
         max_tokens: Maximum tokens in the response. If None, omitted from payload.
         context_length: Context length for the model (used for Ollama and LM Studio loading).
+        use_cache: Whether to look up and store the response in the on-disk LLM
+                   response cache (see llm_cache). Has no effect if no cache is open.
+        refresh_cache: Skip the cache lookup but still store the new response.
 
     Returns:
         The Markdown content as a string if successful, otherwise None.
     """
-    # Default system prompt if none provided
-    if system_prompt is None:
-        system_prompt = "You are a helpful assistant that converts text to well-structured Markdown."
-    
-    # Default user prompt template if none provided
-    if user_prompt_template is None:
-        user_prompt_template = "Convert the following text to well-structured Markdown.\n\nText:\n{text_content}"
-    
-    # For LM Studio, ensure the model is loaded
-    if server_type.lower() == 'lmstudio' and model_identifier:
-        base_url = api_url.replace('/v1/chat/completions', '')
-        loaded_models = get_lmstudio_loaded_models(base_url)
-        if model_identifier not in loaded_models:
-            logger.info(f"Model {model_identifier} not loaded, attempting to load...")
-            if not load_lmstudio_model(base_url, model_identifier, context_length):
-                logger.warning(f"Failed to load model {model_identifier}, proceeding with API call anyway.")
-    
-    formatted_prompt = user_prompt_template.format(text_content=text_content)
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": formatted_prompt}
-    ]
-
-    if server_type.lower() == 'ollama':
-        payload = {
-            "model": model_identifier,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "temperature": temperature,
-                "num_predict": max_tokens if max_tokens else -1,  # Ollama uses -1 for no limit
-                "num_ctx": context_length
-            }
-        }
-    else:  # lmstudio or default to OpenAI format
-        payload = {
-            "messages": messages,
-            "temperature": temperature,
-            "stream": False
-        }
-        
-        # Only add max_tokens if it's specified
-        if max_tokens is not None:
-            payload["max_tokens"] = max_tokens
+    server_type = server_type.lower() # Normalized once; helpers dispatch on it directly
+    body, headers = _prepare_request(
+        text_content, server_type, api_key, model_identifier, system_prompt,
+        user_prompt_template, temperature, max_tokens, context_length
+    )
 
-        if model_identifier: # Check if model_identifier is not None and not empty
-            payload['model'] = model_identifier
+    cache_key = llm_cache.make_key(api_url, body) if use_cache else None
+    if cache_key is not None and not refresh_cache:
+        cached_content = llm_cache.get(cache_key)
+        if cached_content is not None:
+            logger.info("Using cached response from %s API at %s.", server_type, api_url)
+            return cached_content
 
-    headers = {
-        "Content-Type": "application/json"
-    }
-    if api_key:
-        headers["Authorization"] = f"Bearer {api_key}"
+    # For LM Studio, ensure the model is loaded
+    if server_type == 'lmstudio' and model_identifier:
+        _ensure_lmstudio_model(api_url, model_identifier, context_length)
 
     try:
-        logger.info(f"Calling {server_type} API at {api_url}...")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=timeout)
-
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                if server_type.lower() == 'ollama':
-                    if 'message' in response_data and 'content' in response_data['message']:
-                        markdown_content = response_data['message']['content']
-                        logger.info(f"API call to {server_type} API at {api_url} successful, content received.")
-                        return markdown_content.strip()
+        logger.info("Calling %s API at %s...", server_type, api_url)
+        deadline = time.monotonic() + timeout
+        response = _get_session().post(api_url, headers=headers, data=body, timeout=(min(_CONNECT_TIMEOUT, timeout), timeout), stream=True)
+        try:
+            if response.status_code == 200:
+                try:
+                    if _is_streamed(response):
+                        markdown_content = _read_stream(response.iter_lines(), server_type, api_url, deadline)
                     else:
-                        logger.error(f"Unexpected response structure from {server_type} API at {api_url}. Full response: {response.text}")
-                        return None
-                else:  # lmstudio or openai compatible
-                    if 'choices' in response_data and \
-                       isinstance(response_data['choices'], list) and \
-                       len(response_data['choices']) > 0 and \
-                       'message' in response_data['choices'][0] and \
-                       'content' in response_data['choices'][0]['message']:
-
-                        markdown_content = response_data['choices'][0]['message']['content']
-                        logger.info(f"API call to {server_type} API at {api_url} successful, content received.")
-                        return markdown_content.strip()
-                    else:
-                        logger.error(f"Unexpected response structure from {server_type} API at {api_url}. Full response: {response.text}")
-                        return None
-            except json.JSONDecodeError:
-                logger.error(f"Could not decode JSON response from {server_type} API at {api_url}. Response text: {response.text}", exc_info=True)
+                        markdown_content = _extract_content(response, server_type, api_url)
+                except requests.exceptions.ConnectionError as e:
+                    # requests reports a read timeout while consuming the body as a ConnectionError
+                    if e.args and isinstance(e.args[0], ReadTimeoutError):
+                        raise TimeoutError("The server stopped sending the response") from e
+                    raise
+                if markdown_content is not None and cache_key is not None:
+                    llm_cache.put(cache_key, markdown_content)
+                return markdown_content
+            else:
+                logger.error("API request to %s API at %s failed with status code %s. Response: %s", server_type, api_url, response.status_code, response.text)
+                if response.status_code == 404 and server_type == 'lmstudio':
+                    _forget_lmstudio_model(api_url, model_identifier)
                 return None
-        else:
-            logger.error(f"API request to {server_type} API at {api_url} failed with status code {response.status_code}. Response: {response.text}")
-            return None
+        finally:
+            response.close() # Hand the connection back to the session pool
 
-    except requests.exceptions.Timeout:
-        logger.error(f"API request to {server_type} API at {api_url} timed out after {timeout} seconds.", exc_info=True)
+    except (requests.exceptions.Timeout, TimeoutError):
+        logger.error("API request to %s API at %s timed out after %s seconds.", server_type, api_url, timeout, exc_info=True)
         return None
     except requests.exceptions.ConnectionError as e:
         # More specific and user-friendly error for connection issues
-        logger.error(f"Cannot connect to {server_type} API at {api_url}")
-        logger.error("Please ensure that:")
-        if server_type.lower() == 'ollama':
-            logger.error("  1. Ollama is running")
-            logger.error("  2. A model is loaded in Ollama")
-        else:
-            logger.error("  1. LM Studio is running")
-            logger.error("  2. A model is loaded in LM Studio")
-        logger.error(f"  3. The API server is enabled and listening on {api_url}")
-        logger.debug(f"Connection error details: {e}", exc_info=True)
+        _log_connection_error(server_type, api_url, e)
         return None
     except requests.exceptions.RequestException as e:
-        logger.error(f"API request to {server_type} API at {api_url} failed due to a network or request issue: {e}", exc_info=True)
+        logger.error("API request to %s API at %s failed due to a network or request issue: %s", server_type, api_url, e, exc_info=True)
+        return None
+    except Exception as e: # Catch any other unexpected errors during the API call process
+        logger.error("An unexpected error occurred during the API call to %s API at %s: %s", server_type, api_url, e, exc_info=True)
+        return None
+
+def _parse_batch_response(content: str, count: int) -> list[str]:
+    """
+    Splits the response to a batched request into the Markdown of each document.
+
+    Returns the documents in order. If the model's output was cut off, only the
+    complete leading entries are returned; if it cannot be mapped to the
+    documents reliably, an empty list is returned.
+    """
+    text = content.strip()
+    if text.startswith("```"): # Some models wrap JSON in a code fence despite instructions
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+
+    try:
+        items = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        items = None
+    if items is not None:
+        if isinstance(items, list) and len(items) == count and all(isinstance(item, str) for item in items):
+            return items
+        return []
+
+    if not text.startswith("["):
+        return []
+    # Truncated array: keep every string literal that was completed
+    items = []
+    for match in _JSON_STRING_RE.finditer(text):
+        try:
+            items.append(orjson.loads(match.group()))
+        except orjson.JSONDecodeError:
+            break
+    return items[:count]
+
+def call_llm_api_batch(
+    texts: list[str],
+    api_url: str,
+    server_type: str,
+    batch_size: int = 4,
+    **kwargs
+) -> Iterator[tuple[int, str | None]]:
+    """
+    Converts many short documents with fewer requests by sending batch_size
+    documents per prompt and asking the model for a JSON array of results.
+
+    Documents the model's answer does not cover (e.g. because the output was
+    cut off) are converted with an individual call_llm_api request.
+
+    Args:
+        texts: The text contents to be converted.
+        api_url: The API endpoint URL.
+        server_type: 'lmstudio' or 'ollama'
+        batch_size: Number of documents per request.
+        **kwargs: Further keyword arguments passed on to call_llm_api
+                  (api_key, timeout, model_identifier, user_prompt_template, ...).
+
+    Yields:
+        (index, markdown) tuples, where index is the position of the document in
+        texts and markdown is None if its conversion failed.
+    """
+    user_prompt_template = kwargs.get('user_prompt_template') or _DEFAULT_USER_PROMPT_TEMPLATE
+
+    for start in range(0, len(texts), batch_size):
+        group = texts[start:start + batch_size]
+        if len(group) == 1:
+            yield start, call_llm_api(group[0], api_url, server_type, **kwargs)
+            continue
+
+        documents = "\n".join(f"===DOC {offset}===\n{text_content}" for offset, text_content in enumerate(group))
+        batch_kwargs = {**kwargs, 'user_prompt_template': user_prompt_template + _BATCH_INSTRUCTIONS.format(count=len(group))}
+        content = call_llm_api(documents, api_url, server_type, **batch_kwargs)
+        if content is None:
+            # The request itself failed; retrying each document would just repeat the failure
+            for offset in range(len(group)):
+                yield start + offset, None
+            continue
+
+        markdowns = _parse_batch_response(content, len(group))
+        if len(markdowns) < len(group):
+            logger.warning("Batch response from %s API at %s covered %s of %s documents, converting the rest individually.", server_type, api_url, len(markdowns), len(group))
+        for offset, text_content in enumerate(group):
+            if offset < len(markdowns):
+                yield start + offset, markdowns[offset].strip()
+            else:
+                yield start + offset, call_llm_api(text_content, api_url, server_type, **kwargs)
+
+async def _apost_streaming(
+    client: httpx.AsyncClient,
+    api_url: str,
+    headers: dict,
+    body: bytes,
+    timeout: int,
+    server_type: str,
+    model_identifier: str | None = None
+) -> str | None:
+    """
+    Sends the request with httpx and assembles the streamed response.
+    Network errors are left to the caller.
+    """
+    deadline = time.monotonic() + timeout
+    request_timeout = httpx.Timeout(timeout, connect=min(_CONNECT_TIMEOUT, timeout))
+    async with client.stream("POST", api_url, headers=headers, content=body, timeout=request_timeout) as response:
+        if response.status_code != 200:
+            await response.aread()
+            logger.error("API request to %s API at %s failed with status code %s. Response: %s", server_type, api_url, response.status_code, response.text)
+            if response.status_code == 404 and server_type == 'lmstudio':
+                _forget_lmstudio_model(api_url, model_identifier)
+            return None
+        if _is_streamed(response):
+            return await _aread_stream(response.aiter_lines(), server_type, api_url, deadline)
+        await response.aread()
+        return _extract_content(response, server_type, api_url)
+
+async def acall_llm_api(
+    text_content: str,
+    api_url: str,
+    server_type: str,
+    api_key: str | None = None,
+    timeout: int = 60,
+    model_identifier: str | None = None,
+    system_prompt: str | None = None,
+    user_prompt_template: str | None = None,
+    temperature: float = 0.7,
+    max_tokens: int | None = None,
+    context_length: int = 8192,
+    use_cache: bool = False,
+    refresh_cache: bool = False,
+    client: httpx.AsyncClient | None = None
+) -> str | None:
+    """
+    Async counterpart of call_llm_api, using httpx so several documents can be in flight at once.
+
+    Args:
+        client: Shared httpx.AsyncClient to send the request with. If None, a
+                short-lived client is created for this call only.
+
+    All other arguments and the return value are the same as for call_llm_api.
+    """
+    server_type = server_type.lower() # Normalized once; helpers dispatch on it directly
+    body, headers = _prepare_request(
+        text_content, server_type, api_key, model_identifier, system_prompt,
+        user_prompt_template, temperature, max_tokens, context_length
+    )
+    headers["Content-Type"] = "application/json"
+
+    cache_key = llm_cache.make_key(api_url, body) if use_cache else None
+    if cache_key is not None and not refresh_cache:
+        cached_content = llm_cache.get(cache_key)
+        if cached_content is not None:
+            logger.info("Using cached response from %s API at %s.", server_type, api_url)
+            return cached_content
+
+    if server_type == 'lmstudio' and model_identifier:
+        # The model check uses blocking HTTP and subprocess calls, keep it off the event loop
+        await asyncio.to_thread(_ensure_lmstudio_model, api_url, model_identifier, context_length)
+
+    try:
+        logger.info("Calling %s API at %s...", server_type, api_url)
+        if client is None:
+            async with new_async_client() as own_client:
+                markdown_content = await _apost_streaming(own_client, api_url, headers, body, timeout, server_type, model_identifier)
+        else:
+            markdown_content = await _apost_streaming(client, api_url, headers, body, timeout, server_type, model_identifier)
+
+        if markdown_content is not None and cache_key is not None:
+            llm_cache.put(cache_key, markdown_content)
+        return markdown_content
+
+    except (httpx.TimeoutException, TimeoutError):
+        logger.error("API request to %s API at %s timed out after %s seconds.", server_type, api_url, timeout, exc_info=True)
+        return None
+    except httpx.ConnectError as e:
+        _log_connection_error(server_type, api_url, e)
+        return None
+    except httpx.HTTPError as e:
+        logger.error("API request to %s API at %s failed due to a network or request issue: %s", server_type, api_url, e, exc_info=True)
         return None
     except Exception as e: # Catch any other unexpected errors during the API call process
-        logger.error(f"An unexpected error occurred during the API call to {server_type} API at {api_url}: {e}", exc_info=True)
+        logger.error("An unexpected error occurred during the API call to %s API at %s: %s", server_type, api_url, e, exc_info=True)
         return None
 
 if __name__ == '__main__':
@@ -1,85 +1,157 @@
 import configparser
 import os
 import logging
+from functools import lru_cache
+from types import MappingProxyType
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_PATH = 'config/config.ini'
 
-def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> dict:
+def _get_int(section: dict, key: str, default: int) -> int:
+    """Returns section[key] as an int, or default if the key is missing."""
+    value = section.get(key)
+    return default if value is None else int(value)
+
+def _get_float(section: dict, key: str, default: float) -> float:
+    """Returns section[key] as a float, or default if the key is missing."""
+    value = section.get(key)
+    return default if value is None else float(value)
+
+def _get_bool(section: dict, key: str, default: bool) -> bool:
+    """Returns section[key] as a bool (same spellings as ConfigParser.getboolean), or default if the key is missing."""
+    value = section.get(key)
+    if value is None:
+        return default
+    try:
+        return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+    except KeyError:
+        raise ValueError(f"Not a boolean: {value}")
+
+def _get_str(section: dict, key: str, default: str | None) -> str | None:
+    """Returns section[key] as is, or default if the key is missing."""
+    return section.get(key, default)
+
+# Keys that must be present, per section (the API section of the configured server is checked separately)
+_ESSENTIAL_KEYS = {
+    'Server': ('type',),
+    'Directories': ('input_dir', 'output_dir')
+}
+_API_SECTIONS = {'lmstudio': 'LMStudio', 'ollama': 'Ollama'}
+_API_ESSENTIAL_KEYS = ('api_url',)
+
+_VALID_LOG_LEVELS = frozenset({'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'})
+
+# Optional settings with a plain default, as (setting, section, key, getter, default).
+# Section 'api' stands for the API section of the configured server.
+_OPTIONAL_SETTINGS = (
+    ('api_key', 'api', 'api_key', _get_str, None),
+    ('api_timeout', 'api', 'api_timeout', _get_int, 60),
+    ('model_identifier', 'api', 'model_identifier', _get_str, None),
+    ('temperature', 'api', 'temperature', _get_float, 0.7),
+    ('max_concurrency', 'General', 'max_concurrency', _get_int, 4),
+    ('use_asyncio', 'General', 'use_asyncio', _get_bool, False),
+    ('batch_size', 'General', 'batch_size', _get_int, 1),
+    ('log_file', 'Logging', 'log_file', _get_str, 'app.log'),
+    ('caching_enabled', 'Caching', 'enabled', _get_bool, True),
+    ('caching_force_reprocess_all', 'Caching', 'force_reprocess_all', _get_bool, False),
+    ('caching_response_cache', 'Caching', 'response_cache', _get_bool, True),
+    ('caching_response_cache_file', 'Caching', 'response_cache_file', _get_str, '.llm_cache.sqlite3'),
+    ('caching_response_cache_any_temperature', 'Caching', 'response_cache_any_temperature', _get_bool, False),
+    ('caching_content_manifest', 'Caching', 'content_manifest', _get_bool, False),
+)
+# Optional settings that size a pool of workers or a request, so they must be at least 1
+_POSITIVE_SETTINGS = ('max_concurrency', 'batch_size')
+
+def _require(config: configparser.ConfigParser, section: str, keys: tuple, config_path: str, loaded_config: dict) -> None:
+    """Copies the essential keys of section into loaded_config, raising ValueError if one is missing."""
+    if section not in config:
+        logger.error(f"Missing section [{section}] in configuration file: {config_path}")
+        raise ValueError(f"Missing section [{section}] in configuration file: {config_path}")
+    for key in keys:
+        if key not in config[section]:
+            logger.error(f"Missing key '{key}' in section [{section}] in configuration file: {config_path}")
+            raise ValueError(f"Missing key '{key}' in section [{section}] in configuration file: {config_path}")
+        loaded_config[key] = config[section][key]
+
+def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> MappingProxyType:
     """
     Loads configuration from the specified .ini file.
+    The file is parsed once per absolute path, modification time and size;
+    later calls return the same read-only mapping until the file changes.
+    Call load_config.cache_clear() to force a re-read.
 
     Args:
         config_path: Path to the configuration file.
                      Defaults to 'config/config.ini'.
 
     Returns:
-        A dictionary containing the configuration values.
+        A read-only mapping containing the configuration values.
 
     Raises:
         FileNotFoundError: If the configuration file is not found.
-        ValueError: If essential keys are missing from the configuration file.
+        ValueError: If the configuration file cannot be read or essential keys are missing from it.
     """
     if not os.path.exists(config_path):
         logger.error(f"Configuration file not found: {config_path}")
         raise FileNotFoundError(f"Configuration file not found: {config_path}")
 
-    config = configparser.ConfigParser()
-    config.read(config_path)
+    config_path = os.path.abspath(config_path)
+    stat_result = os.stat(config_path)
+    return _parse_config(config_path, stat_result.st_mtime_ns, stat_result.st_size)
 
-    # Essential keys that must be present
-    essential_sections = {
-        'Server': ['type'],
-        'Directories': ['input_dir', 'output_dir']
-    }
+@lru_cache(maxsize=8)
+def _parse_config(config_path: str, mtime_ns: int, size: int) -> MappingProxyType:
+    """
+    Parses the configuration file at config_path (an absolute path).
+    Memoized, so logger, main and any other caller share a single parse;
+    mtime_ns and size only serve as part of the cache key, so an edited file is parsed again.
+    """
+    # No interpolation: values are taken literally, so prompts may contain '%'
+    config = configparser.ConfigParser(interpolation=None)
+    # One read of the whole (small) file, decoded as UTF-8 regardless of the locale
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"Could not read configuration file {config_path}: {e}")
+        raise ValueError(f"Could not read configuration file {config_path}: {e}")
+    config.read_string(content, source=config_path)
 
     loaded_config = {}
-
-    for section, keys in essential_sections.items():
-        if section not in config:
-            logger.error(f"Missing section [{section}] in configuration file: {config_path}")
-            raise ValueError(f"Missing section [{section}] in configuration file: {config_path}")
-        for key in keys:
-            if key not in config[section]:
-                logger.error(f"Missing key '{key}' in section [{section}] in configuration file: {config_path}")
-                raise ValueError(f"Missing key '{key}' in section [{section}] in configuration file: {config_path}")
-            loaded_config[key] = config[section][key]
+    for section, keys in _ESSENTIAL_KEYS.items():
+        _require(config, section, keys, config_path, loaded_config)
 
     # Get server type and determine API section
     server_type = loaded_config['type'].lower()
-    if server_type == 'lmstudio':
-        api_section = 'LMStudio'
-    elif server_type == 'ollama':
-        api_section = 'Ollama'
-    else:
+    api_section = _API_SECTIONS.get(server_type)
+    if api_section is None:
         logger.error(f"Invalid server type '{server_type}' in configuration file: {config_path}")
         raise ValueError(f"Invalid server type '{server_type}' in configuration file: {config_path}")
+    _require(config, api_section, _API_ESSENTIAL_KEYS, config_path, loaded_config)
+
+    # Read the sections we need once; lookups below are plain dict accesses
+    # (defaults apply if a section or a key is missing)
+    sections = {
+        name: dict(config[name]) if name in config else {}
+        for name in ('General', 'Logging', 'Caching')
+    }
+    sections['api'] = api = dict(config[api_section])
+    general = sections['General']
+
+    for setting, section, key, get_value, default in _OPTIONAL_SETTINGS:
+        loaded_config[setting] = get_value(sections[section], key, default)
+    for setting in _POSITIVE_SETTINGS:
+        if loaded_config[setting] < 1:
+            logger.error(f"Invalid {setting} {loaded_config[setting]} in configuration file: {config_path} (must be at least 1)")
+            raise ValueError(f"Invalid {setting} {loaded_config[setting]} in configuration file: {config_path} (must be at least 1)")
+
+    # Prompts in [General] take precedence over the ones in the API section
+    loaded_config['system_prompt'] = general.get('system_prompt', api.get('system_prompt'))
+    loaded_config['user_prompt_template'] = general.get('user_prompt_template', api.get('user_prompt_template'))
 
-    # Add API section to essential if not already
-    if api_section not in essential_sections:
-        essential_sections[api_section] = ['api_url']
-        # Check it
-        if api_section not in config:
-            logger.error(f"Missing section [{api_section}] in configuration file: {config_path}")
-            raise ValueError(f"Missing section [{api_section}] in configuration file: {config_path}")
-        for key in essential_sections[api_section]:
-            if key not in config[api_section]:
-                logger.error(f"Missing key '{key}' in section [{api_section}] in configuration file: {config_path}")
-                raise ValueError(f"Missing key '{key}' in section [{api_section}] in configuration file: {config_path}")
-            loaded_config[key] = config[api_section][key]
-
-    # Optional keys from API section
-    # Optional keys from API section
-    loaded_config['api_key'] = config.get(api_section, 'api_key', fallback=None)
-    loaded_config['api_timeout'] = config.getint(api_section, 'api_timeout', fallback=60)
-    loaded_config['model_identifier'] = config.get(api_section, 'model_identifier', fallback=None)
-    loaded_config['system_prompt'] = config.get('General', 'system_prompt', fallback=config.get(api_section, 'system_prompt', fallback=None))
-    loaded_config['user_prompt_template'] = config.get('General', 'user_prompt_template', fallback=config.get(api_section, 'user_prompt_template', fallback=None))
-    loaded_config['temperature'] = config.getfloat(api_section, 'temperature', fallback=0.7)
-    
     # max_tokens can be None (no limit) or an integer
-    max_tokens_str = config.get(api_section, 'max_tokens', fallback=None)
+    max_tokens_str = api.get('max_tokens')
     if max_tokens_str:
         try:
             loaded_config['max_tokens'] = int(max_tokens_str)
@@ -89,41 +161,22 @@ def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> dict:
         loaded_config['max_tokens'] = None
 
     # context_length
-    context_length_str = config.get(api_section, 'context_length', fallback='8192')
     try:
-        loaded_config['context_length'] = int(context_length_str)
+        loaded_config['context_length'] = int(api.get('context_length', '8192'))
     except ValueError:
         loaded_config['context_length'] = 8192
 
     # Directories (no optional keys specified for now beyond what's essential)
 
-    # Logging
-    if 'Logging' in config:
-        loaded_config['log_file'] = config.get('Logging', 'log_file', fallback='app.log')
-        loaded_config['log_level'] = config.get('Logging', 'log_level', fallback='INFO').upper()
-    else: # Default logging section if not present
-        loaded_config['log_file'] = 'app.log'
-        loaded_config['log_level'] = 'INFO'
-
-    # Validate log_level (optional, but good practice)
-    valid_log_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-    if loaded_config['log_level'] not in valid_log_levels:
-        # Default to INFO if an invalid level is provided, and maybe log a warning later if logging is set up
-        # For now, let's be strict or default silently. Silently defaulting for now.
-        # If an invalid log level is provided, we default to INFO,
-        # and a message could be logged if logging was already set up.
-        # However, this function is called BY setup_logging, so we can't log here about that yet.
-        loaded_config['log_level'] = 'INFO'
-
-    # Caching settings
-    if 'Caching' in config:
-        loaded_config['caching_enabled'] = config.getboolean('Caching', 'enabled', fallback=True)
-        loaded_config['caching_force_reprocess_all'] = config.getboolean('Caching', 'force_reprocess_all', fallback=False)
-    else: # Default caching section if not present
-        loaded_config['caching_enabled'] = True
-        loaded_config['caching_force_reprocess_all'] = False
-
-    return loaded_config
+    # Logging: an invalid level silently defaults to INFO.
+    # This function is called BY setup_logging, so we can't log here about that yet.
+    log_level = sections['Logging'].get('log_level', 'INFO').upper()
+    loaded_config['log_level'] = log_level if log_level in _VALID_LOG_LEVELS else 'INFO'
+
+    # Read-only, since every caller shares this object
+    return MappingProxyType(loaded_config)
+
+load_config.cache_clear = _parse_config.cache_clear
 
 if __name__ == '__main__':
     # This basic setup is for testing config_handler.py directly.
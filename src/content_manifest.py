@@ -0,0 +1,60 @@
+import hashlib
+import logging
+import os
+from functools import partial
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Stored in the output directory, next to the Markdown files it describes
+MANIFEST_FILE = '.manifest.json'
+
+_CHUNK_SIZE = 1024 * 1024 # Bytes hashed per read in file_digest
+
+def load_manifest(manifest_path: str) -> dict[str, str]:
+    """
+    Loads the content manifest, which maps input files (relative to the input
+    directory) to the SHA-256 digest of the content they were last converted from.
+
+    Args:
+        manifest_path: Path to the manifest file.
+
+    Returns:
+        The manifest, or an empty one if the file is missing or unreadable.
+    """
+    try:
+        with open(manifest_path, 'rb') as f:
+            manifest = orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.warning("Could not read content manifest %s: %s. Starting with an empty one.", manifest_path, e)
+        return {}
+    if not isinstance(manifest, dict):
+        logger.warning("Content manifest %s is not a JSON object. Starting with an empty one.", manifest_path)
+        return {}
+    return manifest
+
+def save_manifest(manifest_path: str, manifest: dict[str, str]) -> None:
+    """
+    Writes the content manifest, replacing the previous file atomically.
+    """
+    tmp_path = manifest_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(manifest, option=orjson.OPT_SORT_KEYS))
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        logger.error("Could not write content manifest %s: %s", manifest_path, e)
+
+def file_digest(file_path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's raw bytes, read in chunks of
+    _CHUNK_SIZE (hashlib.file_digest would do the same, but needs Python 3.11).
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(partial(f.read, _CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
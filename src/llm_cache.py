@@ -0,0 +1,84 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = '.llm_cache.sqlite3'
+
+# Connection to the cache database, opened by open_cache()
+_connection: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+def open_cache(cache_path: str = DEFAULT_CACHE_FILE) -> None:
+    """
+    Opens (and creates if needed) the SQLite database used to cache LLM responses.
+    Until this is called, get() always misses and put() does nothing.
+
+    Args:
+        cache_path: Path to the SQLite database file.
+    """
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        try:
+            connection = sqlite3.connect(cache_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL)")
+            connection.commit()
+        except sqlite3.Error as e:
+            logger.warning("Could not open LLM response cache at %s: %s. Continuing without it.", cache_path, e)
+            return
+        _connection = connection
+    logger.info("LLM response cache opened at: %s", cache_path)
+
+def close_cache() -> None:
+    """
+    Closes the cache database if it is open.
+    """
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+def make_key(*parts: str | bytes) -> str:
+    """
+    Builds a cache key from everything that determines an LLM response
+    (endpoint, model, prompts, sampling parameters, ...).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode('utf-8') if isinstance(part, str) else part)
+        digest.update(b'\0') # Separator, so ('ab', 'c') and ('a', 'bc') differ
+    return digest.hexdigest()
+
+def get(key: str) -> str | None:
+    """
+    Returns the cached response for key, or None on a miss or if no cache is open.
+    """
+    with _lock:
+        if _connection is None:
+            return None
+        try:
+            row = _connection.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("LLM response cache lookup failed: %s", e)
+            return None
+    return row[0] if row else None
+
+def put(key: str, content: str) -> None:
+    """
+    Stores a response in the cache. Does nothing if no cache is open.
+    """
+    with _lock:
+        if _connection is None:
+            return
+        try:
+            _connection.execute("INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)", (key, content))
+            _connection.commit()
+        except sqlite3.Error as e:
+            logger.warning("Could not write to LLM response cache: %s", e)
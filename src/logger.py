@@ -1,19 +1,10 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
-# To avoid circular dependency if config_handler itself needs to log during its import phase,
-# setup_logging should ideally be called after config_handler is imported.
-# For this setup, we assume config_handler can be imported and used by setup_logging.
-# If config_handler had complex setup that logged, we'd pass config values to setup_logging.
-
-# Add project root to sys.path to allow for `from src.config_handler import load_config`
-project_root = Path(__file__).resolve().parent.parent
-if str(project_root) not in sys.path:
-    sys.path.insert(0, str(project_root))
-
-from src.config_handler import load_config
-
 DEFAULT_LOG_FILE = 'app.log'
 DEFAULT_LOG_LEVEL = 'INFO'
 
@@ -21,10 +12,19 @@ def setup_logging():
     """
     Configures the root logger for the application.
     Reads log file path and log level from config.ini.
+
+    Records are put on a queue by the calling thread and written to the file
+    and console by a background QueueListener, so logging never blocks on I/O.
     """
+    # Imported here rather than at module level so that importing this module
+    # stays cheap and does not depend on sys.path being set up already.
+    from src.config_handler import load_config
+
+    # logger.py is in src/, config/ and the log file live in the project root
+    project_root = Path(__file__).resolve().parent.parent
+
     try:
         # Determine config path relative to this file's project structure
-        # logger.py is in src/, config/ is sibling to src/
         config_file_path = project_root / 'config' / 'config.ini'
         config = load_config(config_path=str(config_file_path))
 
@@ -59,11 +59,13 @@ def setup_logging():
     # Define formatter
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s')
 
+    handlers = []
+
     # Create File Handler
     try:
         file_handler = logging.FileHandler(log_file_path)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except Exception as e:
         # This print is acceptable here as logging isn't fully set up.
         print(f"Error setting up file handler for logging: {e}. Logs may not be written to file.", file=sys.stderr)
@@ -73,14 +75,25 @@ def setup_logging():
     console_handler.setFormatter(formatter)
     # Optionally set a different (lower) level for console, e.g., only show INFO and above on console
     # console_handler.setLevel(logging.INFO)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
+
+    # The root logger only enqueues; the listener thread formats and writes.
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Flushes queued records on exit
 
     # Test log message
     # logger.info("Logging setup complete. Logging to file and console.")
     # (This might be too early if other modules haven't initialized their loggers yet)
 
 if __name__ == '__main__':
-    # This block is for testing logger.py directly
+    # This block is for testing logger.py directly; make `src` importable first
+    project_root = Path(__file__).resolve().parent.parent
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
     print("Setting up logging from logger.py's main...")
     setup_logging()
     # Now, any module can get this logger
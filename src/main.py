@@ -1,6 +1,12 @@
+import asyncio
 import os
 from pathlib import Path
 import shutil # For safely creating output directory later, though mkdir can do it.
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Iterator
+import httpx
 from tqdm import tqdm
 import sys
 
@@ -11,7 +17,9 @@ if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
 from src.config_handler import load_config
-from src.api_handler import call_llm_api
+from src.api_handler import call_llm_api, call_llm_api_batch, acall_llm_api, new_async_client, set_connection_pool_size
+from src import llm_cache
+from src import content_manifest
 from src.logger import setup_logging # Import setup_logging
 import logging # Import logging
 
@@ -19,30 +27,464 @@ import logging # Import logging
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class FileResult:
+    """Outcome of processing a single input file."""
+    status: str # 'processed', 'failed' or 'unreadable'
+    api_failed: bool = False # True if the API returned no Markdown for the file
+
+
+def iter_txt_files(root: str) -> Iterator[str]:
+    """
+    Yields the paths of all .txt files below root, recursively.
+
+    Uses os.scandir, whose entries already know whether they are files or
+    directories, instead of Path.rglob, which builds and stats a Path object for
+    every entry. Symlinked directories are not followed, so links cannot cause loops.
+
+    Args:
+        root: The directory to scan.
+
+    Yields:
+        The path of each .txt file as a string.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.txt') and entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            if directory == root:
+                raise
+            logger.warning("Could not scan directory %s: %s", directory, e)
+
+
+def _output_path_for(file_path: str, input_dir_path: Path, output_dir_path: Path) -> Path:
+    """
+    Returns the path of the Markdown file for file_path, mirroring its location below input_dir_path.
+    """
+    # The scanner yields paths that start with the input directory, so plain string
+    # slicing gives the relative path without building intermediate Path objects.
+    input_prefix = os.path.join(str(input_dir_path), '')
+    if file_path.startswith(input_prefix):
+        relative_path = file_path[len(input_prefix):]
+    else:
+        logger.error("Error determining relative path for %s: not below %s. Using fallback name.", file_path, input_dir_path)
+        # Fallback name for output file if relative path fails
+        relative_path = os.path.basename(file_path)
+    return output_dir_path / (os.path.splitext(relative_path)[0] + '.md')
+
+
+def _needs_processing(file_path: str, output_file_path: Path, config: dict) -> bool:
+    """
+    Applies the caching settings: returns False if output_file_path is up-to-date
+    and the file can be skipped.
+    """
+    # Caching logic implementation
+    if config['caching_force_reprocess_all']:
+        logger.info("Processing (forced by force_reprocess_all): %s", file_path)
+    elif not config['caching_enabled']:
+        logger.info("Processing (caching disabled): %s", file_path)
+    else:
+        # Caching is enabled and not forcing all, proceed with mtime checks
+        logger.info("Checking cache for output file (caching enabled): %s", output_file_path)
+        # One stat per file: a missing output raises instead of needing an exists() check first.
+        # Integer nanoseconds keep sub-microsecond mtime differences that float seconds round away.
+        try:
+            output_mtime = os.stat(output_file_path).st_mtime_ns
+        except FileNotFoundError:
+            logger.info("Processing (output missing): %s for input %s", output_file_path, file_path)
+            return True
+        try:
+            input_mtime = os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            logger.warning("File not found during mtime check for %s or %s. Processing.", file_path, output_file_path, exc_info=True)
+            return True
+        if output_mtime >= input_mtime:
+            logger.info("Skipping (up-to-date): %s -> %s. Input mtime (ns): %s, Output mtime (ns): %s", file_path, output_file_path, input_mtime, output_mtime)
+            return False
+        logger.info("Processing (output older): %s -> %s. Input mtime (ns): %s, Output mtime (ns): %s", file_path, output_file_path, input_mtime, output_mtime)
+    return True
+
+
+def plan_jobs(
+    txt_files: list[str],
+    config: dict,
+    input_dir_path: Path,
+    output_dir_path: Path
+) -> list[tuple[str, Path]]:
+    """
+    Works out the output path of every input file and applies the caching
+    settings in a single pass, before any worker is started, so up-to-date
+    files never reach the worker pool.
+
+    Returns:
+        (input file, output file) pairs of the files that need processing, in scan order.
+    """
+    jobs = []
+    for file_path in txt_files:
+        logger.info("Checking file: %s", file_path) # Changed log message
+        output_file_path = _output_path_for(file_path, input_dir_path, output_dir_path)
+        if _needs_processing(file_path, output_file_path, config):
+            jobs.append((file_path, output_file_path))
+    return jobs
+
+
+def _manifest_key(file_path: str, input_dir_path: Path) -> str:
+    """
+    Key of an input file in the content manifest: its path relative to the input directory.
+    """
+    return os.path.relpath(file_path, input_dir_path)
+
+
+def filter_unchanged(
+    jobs: list[tuple[str, Path]],
+    manifest: dict[str, str],
+    input_dir_path: Path
+) -> tuple[list[tuple[str, Path]], dict[str, str]]:
+    """
+    Drops the jobs whose input content is unchanged since its existing output
+    was written, according to the content manifest (e.g. files that only got a
+    new mtime from a git checkout or rsync). The outputs of those files are
+    touched, so the mtime check skips them without hashing on the next run.
+
+    Args:
+        jobs: The (input file, output file) pairs returned by plan_jobs.
+        manifest: The content manifest, see content_manifest.load_manifest.
+        input_dir_path: The input directory the manifest keys are relative to.
+
+    Returns:
+        The remaining jobs, and the content digests of their input files
+        (keyed by input file) to record once they are converted.
+    """
+    remaining = []
+    digests = {}
+    for file_path, output_file_path in jobs:
+        try:
+            digest = content_manifest.file_digest(file_path)
+        except OSError as e:
+            logger.warning("Could not hash %s: %s", file_path, e)
+            remaining.append((file_path, output_file_path))
+            continue
+        if manifest.get(_manifest_key(file_path, input_dir_path)) == digest and os.path.exists(output_file_path):
+            logger.info("Skipping (content unchanged): %s -> %s", file_path, output_file_path)
+            try:
+                os.utime(output_file_path)
+            except OSError:
+                pass
+            continue
+        remaining.append((file_path, output_file_path))
+        digests[file_path] = digest
+    return remaining, digests
+
+
+def create_output_dirs(jobs: list[tuple[str, Path]]) -> None:
+    """
+    Creates the output subdirectories of all jobs up front, once per distinct
+    directory, so the workers do not issue a mkdir for every file they write.
+    A directory that cannot be created is logged; writing into it then fails per file.
+    """
+    for output_dir in dict.fromkeys(output_file_path.parent for _, output_file_path in jobs):
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.error("Error creating output directory %s: %s", output_dir, e, exc_info=True)
+
+
+def _read_input(file_path: str) -> str | None:
+    """
+    Reads an input file, or returns None (after logging) if it cannot be read.
+
+    The file is read as bytes in one call and decoded once, which avoids the
+    chunked decoding of a text-mode file object. Line endings are normalized to
+    "\n" like text mode would.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            text = f.read().decode('utf-8')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+    except (IOError, UnicodeDecodeError) as e:
+        logger.error("Error reading file %s: %s", file_path, e, exc_info=True)
+        return None
+
+
+def _write_output(output_file_path: Path, markdown_output: str) -> FileResult:
+    """
+    Writes the Markdown for one file into its (already created, see
+    create_output_dirs) output subdirectory. The data goes to a temporary file next to the target which then replaces it,
+    so an interrupted run never leaves a truncated .md that looks up-to-date.
+    """
+    data = markdown_output.encode('utf-8')
+    tmp_path = output_file_path.with_name(output_file_path.name + '.tmp')
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view: # os.write may write less than requested
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, output_file_path)
+        logger.info("Successfully wrote Markdown to: %s", output_file_path)
+        return FileResult('processed')
+    except OSError as e:
+        logger.error("Error writing Markdown file %s: %s", output_file_path, e, exc_info=True)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return FileResult('failed')
+
+
+def _api_arguments(config: dict, use_response_cache: bool) -> dict:
+    """
+    Keyword arguments for call_llm_api / acall_llm_api taken from the configuration.
+    They are the same for every file, so the drivers build them once per run.
+    """
+    return dict(
+        timeout=config.get('api_timeout', 60), # Ensure a default here as well
+        model_identifier=config.get('model_identifier'),
+        system_prompt=config.get('system_prompt'),
+        user_prompt_template=config.get('user_prompt_template'),
+        temperature=config.get('temperature', 0.7),
+        max_tokens=config.get('max_tokens'),
+        context_length=config.get('context_length', 8192),
+        use_cache=use_response_cache,
+        refresh_cache=config['caching_force_reprocess_all']
+    )
+
+
+def process_one(
+    file_path: str,
+    output_file_path: Path,
+    config: dict,
+    api_arguments: dict
+) -> FileResult:
+    """
+    Processes a single .txt file that needs (re)processing: reads it,
+    converts it via the API and writes the result.
+
+    Args:
+        file_path: The input .txt file.
+        output_file_path: Where to write the Markdown.
+        config: The loaded configuration.
+        api_arguments: Keyword arguments for call_llm_api, see _api_arguments.
+
+    Returns:
+        A FileResult describing what happened to the file.
+    """
+    # Proceed with reading input and calling API
+    file_content = _read_input(file_path)
+    if file_content is None:
+        return FileResult('unreadable')
+
+    logger.debug("Calling API for file: %s", os.path.basename(file_path))
+    markdown_output = call_llm_api(
+        file_content,
+        config['api_url'],
+        config['type'],
+        config.get('api_key'),
+        **api_arguments
+    )
+
+    if markdown_output is None:
+        logger.warning("Failed to get Markdown from API for %s. Skipping this file.", os.path.basename(file_path))
+        return FileResult('failed', api_failed=True)
+
+    return _write_output(output_file_path, markdown_output)
+
+
+def process_batch(
+    jobs: list[tuple[str, Path]],
+    config: dict,
+    api_arguments: dict
+) -> list[FileResult]:
+    """
+    Processes a group of files with a single API request via call_llm_api_batch
+    (documents the model's answer does not cover are converted individually).
+
+    Args:
+        jobs: The (input file, output file) pairs of the group.
+        config: The loaded configuration.
+        api_arguments: Keyword arguments for call_llm_api, see _api_arguments.
+
+    Returns:
+        The FileResults in the order of jobs.
+    """
+    results: list[FileResult | None] = [None] * len(jobs)
+    readable = [] # (index in jobs, file content)
+    for index, (file_path, _) in enumerate(jobs):
+        file_content = _read_input(file_path)
+        if file_content is None:
+            results[index] = FileResult('unreadable')
+        else:
+            readable.append((index, file_content))
+
+    logger.debug("Calling API for %s files in one batch", len(readable))
+    converted = call_llm_api_batch(
+        [file_content for _, file_content in readable],
+        config['api_url'],
+        config['type'],
+        batch_size=max(len(readable), 1),
+        api_key=config.get('api_key'),
+        **api_arguments
+    )
+    for offset, markdown_output in converted:
+        index = readable[offset][0]
+        file_path, output_file_path = jobs[index]
+        if markdown_output is None:
+            logger.warning("Failed to get Markdown from API for %s. Skipping this file.", os.path.basename(file_path))
+            results[index] = FileResult('failed', api_failed=True)
+        else:
+            results[index] = _write_output(output_file_path, markdown_output)
+    return results
+
+
+def process_files_threaded(
+    jobs: list[tuple[str, Path]],
+    config: dict,
+    use_response_cache: bool
+) -> list[FileResult]:
+    """
+    Runs process_one for every (input file, output file) job on a pool of
+    max_concurrency threads. The API calls are network-bound, so threads keep
+    several requests in flight. With batch_size > 1, each thread converts
+    groups of batch_size files via process_batch instead.
+
+    Returns:
+        The FileResults in the order of jobs.
+    """
+    max_workers = config.get('max_concurrency', 4)
+    set_connection_pool_size(max_workers) # One kept-alive connection per worker
+    api_arguments = _api_arguments(config, use_response_cache)
+    batch_size = config.get('batch_size', 1)
+    if batch_size > 1:
+        groups = [jobs[start:start + batch_size] for start in range(0, len(jobs), batch_size)]
+        process_group = partial(process_batch, config=config, api_arguments=api_arguments)
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                tqdm(total=len(jobs), desc="Processing files") as progress:
+            for group_results in executor.map(process_group, groups):
+                results.extend(group_results)
+                progress.update(len(group_results))
+        return results
+
+    process_file = partial(process_one, config=config, api_arguments=api_arguments)
+    input_paths = [file_path for file_path, _ in jobs]
+    output_paths = [output_file_path for _, output_file_path in jobs]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(tqdm(executor.map(process_file, input_paths, output_paths), total=len(jobs), desc="Processing files"))
+
+
+async def process_one_async(
+    semaphore: asyncio.Semaphore,
+    client: httpx.AsyncClient,
+    file_path: str,
+    output_file_path: Path,
+    config: dict,
+    api_arguments: dict
+) -> FileResult:
+    """
+    Async counterpart of process_one. File I/O runs in worker threads so it does
+    not block the event loop. The semaphore is held from reading the input to
+    writing the output, so at most max_concurrency files are in memory at once.
+    """
+    async with semaphore:
+        file_content = await asyncio.to_thread(_read_input, file_path)
+        if file_content is None:
+            return FileResult('unreadable')
+
+        logger.debug("Calling API for file: %s", os.path.basename(file_path))
+        markdown_output = await acall_llm_api(
+            file_content,
+            config['api_url'],
+            config['type'],
+            config.get('api_key'),
+            client=client,
+            **api_arguments
+        )
+
+        if markdown_output is None:
+            logger.warning("Failed to get Markdown from API for %s. Skipping this file.", os.path.basename(file_path))
+            return FileResult('failed', api_failed=True)
+
+        return await asyncio.to_thread(_write_output, output_file_path, markdown_output)
+
+
+async def process_files_async(
+    jobs: list[tuple[str, Path]],
+    config: dict,
+    use_response_cache: bool
+) -> list[FileResult]:
+    """
+    Processes all (input file, output file) jobs on one event loop, sharing a
+    single httpx client whose connections are reused across requests.
+
+    Returns:
+        The FileResults in the order of jobs.
+    """
+    max_concurrency = config.get('max_concurrency', 4)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    api_arguments = _api_arguments(config, use_response_cache)
+
+    with tqdm(total=len(jobs), desc="Processing files") as progress:
+        async with new_async_client(max_concurrency) as client:
+            async def _process(file_path: str, output_file_path: Path) -> FileResult:
+                result = await process_one_async(
+                    semaphore, client, file_path, output_file_path, config, api_arguments
+                )
+                progress.update(1)
+                return result
+
+            return await asyncio.gather(*(_process(file_path, output_file_path) for file_path, output_file_path in jobs))
+
+
 def process_directory():
     """
     Loads configuration, scans the input directory for .txt files,
     processes them (calling API for markdown conversion), and saves
     them to the output directory, preserving subdirectory structure.
+    Up to max_concurrency files are processed at the same time, on a thread
+    pool or, if use_asyncio is set, on an asyncio event loop.
     """
     try:
         config = load_config(config_path=str(project_root / 'config/config.ini'))
         logger.info("Configuration loaded successfully.")
     except FileNotFoundError as e:
-        logger.error(f"Critical: Configuration file not found. {e}", exc_info=True)
+        logger.error("Critical: Configuration file not found. %s", e, exc_info=True)
         return
     except ValueError as e:
-        logger.error(f"Critical: Invalid or missing configuration. {e}", exc_info=True)
+        logger.error("Critical: Invalid or missing configuration. %s", e, exc_info=True)
         return
 
     # Caching flags from config
     enabled_flag = config['caching_enabled']
     force_reprocess_all_flag = config['caching_force_reprocess_all']
-    logger.info(f"Caching enabled: {enabled_flag}, Force reprocess all: {force_reprocess_all_flag}")
+    logger.info("Caching enabled: %s, Force reprocess all: %s", enabled_flag, force_reprocess_all_flag)
+
+    # The response cache only pays off when the same request gives the same answer,
+    # i.e. at temperature 0, unless the user explicitly opts in for other temperatures.
+    use_response_cache = (
+        enabled_flag
+        and config['caching_response_cache']
+        and (config.get('temperature', 0.7) == 0 or config.get('caching_response_cache_any_temperature', False))
+    )
+
+    # Content hashes only refine the mtime check, so they skip no file when caching is off or every
+    # file is reprocessed anyway; the manifest is still updated then, so it keeps matching the outputs
+    use_manifest = config.get('caching_content_manifest', False)
+    skip_unchanged = use_manifest and enabled_flag and not force_reprocess_all_flag
 
     model_identifier = config.get('model_identifier')
     if model_identifier:
-        logger.info(f"Using Model Identifier: {model_identifier}")
+        logger.info("Using Model Identifier: %s", model_identifier)
     else:
         logger.info("No Model Identifier configured, using API default.")
 
@@ -50,121 +492,76 @@ def process_directory():
     output_dir_path = Path(config['output_dir'])
 
     if not input_dir_path.is_dir():
-        logger.error(f"Input directory not found or is not a directory: {input_dir_path}")
+        logger.error("Input directory not found or is not a directory: %s", input_dir_path)
         return
 
     output_dir_path.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Output directory ensured at: {output_dir_path}")
+    logger.info("Output directory ensured at: %s", output_dir_path)
 
-    logger.info(f"Scanning for .txt files in: {input_dir_path}")
+    logger.info("Scanning for .txt files in: %s", input_dir_path)
     try:
-        txt_files = list(input_dir_path.rglob('*.txt'))
+        txt_files = list(iter_txt_files(str(input_dir_path)))
         if not txt_files:
-            logger.info(f"No .txt files found in {input_dir_path}.")
+            logger.info("No .txt files found in %s.", input_dir_path)
             return
     except Exception as e:
-        logger.error(f"Error scanning for files in {input_dir_path}: {e}", exc_info=True)
+        logger.error("Error scanning for files in %s: %s", input_dir_path, e, exc_info=True)
         return
 
-    logger.info(f"Found {len(txt_files)} .txt files. Starting processing...")
+    logger.info("Found %s .txt files. Starting processing...", len(txt_files))
 
-    processed_count = 0
-    skipped_count = 0
-    failed_count = 0
-    connection_error_encountered = False
-
-    for file_path in tqdm(txt_files, desc="Processing files"):
-        logger.info(f"Checking file: {file_path}") # Changed log message
+    if use_response_cache:
+        llm_cache.open_cache(str(project_root / config.get('caching_response_cache_file', llm_cache.DEFAULT_CACHE_FILE)))
 
-        # Determine output_file_path early for caching
-        try:
-            relative_path = file_path.relative_to(input_dir_path)
-            output_file_path = output_dir_path / relative_path.with_suffix('.md')
-        except ValueError as e:
-            logger.error(f"Error determining relative path for {file_path}: {e}. Using fallback name.", exc_info=True)
-            # Fallback name for output file if relative path fails
-            output_file_path = output_dir_path / file_path.name.replace(".txt", ".md")
-
-        # Caching logic implementation
-        if force_reprocess_all_flag:
-            logger.info(f"Processing (forced by force_reprocess_all): {file_path}")
-        elif not enabled_flag:
-            logger.info(f"Processing (caching disabled): {file_path}")
+    jobs = plan_jobs(txt_files, config, input_dir_path, output_dir_path)
+    if use_manifest:
+        manifest_path = str(output_dir_path / content_manifest.MANIFEST_FILE)
+        manifest = content_manifest.load_manifest(manifest_path)
+        if skip_unchanged:
+            jobs, digests = filter_unchanged(jobs, manifest, input_dir_path)
         else:
-            # Caching is enabled and not forcing all, proceed with mtime checks
-            logger.info(f"Checking cache for output file (caching enabled): {output_file_path}")
-            if output_file_path.exists():
-                try:
-                    input_mtime = file_path.stat().st_mtime
-                    output_mtime = output_file_path.stat().st_mtime
-                    if output_mtime >= input_mtime:
-                        logger.info(f"Skipping (up-to-date): {file_path} -> {output_file_path}. Input mtime: {input_mtime}, Output mtime: {output_mtime}")
-                        skipped_count += 1
-                        continue
-                    else:
-                        logger.info(f"Processing (output older): {file_path} -> {output_file_path}. Input mtime: {input_mtime}, Output mtime: {output_mtime}")
-                except FileNotFoundError:
-                    logger.warning(f"File not found during mtime check for {file_path} or {output_file_path}. Processing.", exc_info=True)
-            else:
-                logger.info(f"Processing (output missing): {output_file_path} for input {file_path}")
+            digests = {}
+    create_output_dirs(jobs)
 
-        # Proceed with reading input and calling API
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-        except (IOError, UnicodeDecodeError) as e:
-            logger.error(f"Error reading file {file_path}: {e}", exc_info=True)
-            continue
+    processed_count = 0
+    skipped_count = len(txt_files) - len(jobs)
+    failed_count = 0
+    connection_error_encountered = False
 
-        logger.debug(f"Calling API for file: {file_path.name}")
-        api_timeout = config.get('api_timeout', 60) # Ensure a default here as well
-        markdown_output = call_llm_api(
-            file_content,
-            config['api_url'],
-            config['type'],
-            config.get('api_key'),
-            timeout=api_timeout,
-            model_identifier=model_identifier,
-            system_prompt=config.get('system_prompt'),
-            user_prompt_template=config.get('user_prompt_template'),
-            temperature=config.get('temperature', 0.7),
-            max_tokens=config.get('max_tokens'),
-            context_length=config.get('context_length', 8192)
-        )
+    if not jobs:
+        results = []
+    elif config.get('use_asyncio', False):
+        results = asyncio.run(process_files_async(jobs, config, use_response_cache))
+    else:
+        results = process_files_threaded(jobs, config, use_response_cache)
 
-        if markdown_output is None:
-            logger.warning(f"Failed to get Markdown from API for {file_path.name}. Skipping this file.")
+    # Results are in input order, so the summary is deterministic
+    for result in results:
+        if result.status == 'processed':
+            processed_count += 1
+        elif result.status == 'failed':
             failed_count += 1
             # Check if this looks like a connection error (first failure)
-            if failed_count == 1:
+            if failed_count == 1 and result.api_failed:
                 connection_error_encountered = True
-            continue
-
-        try:
-            relative_path = file_path.relative_to(input_dir_path)
-            output_file_path = output_dir_path / relative_path.with_suffix('.md')
-        except ValueError as e:
-            logger.error(f"Error determining relative path for {file_path}: {e}. Using fallback name.", exc_info=True)
-            # This part is already handled above when output_file_path is defined for caching
-            # output_file_path = output_dir_path / file_path.name.replace(".txt", ".md")
-            # However, we still need to ensure the parent directory exists before writing.
-            pass # output_file_path is already defined
 
-        output_file_path.parent.mkdir(parents=True, exist_ok=True)
+    llm_cache.close_cache()
 
-        try:
-            with open(output_file_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_output)
-            logger.info(f"Successfully wrote Markdown to: {output_file_path}")
-            processed_count += 1
-        except IOError as e:
-            logger.error(f"Error writing Markdown file {output_file_path}: {e}", exc_info=True)
-            failed_count += 1
+    if use_manifest and results:
+        for (file_path, _), result in zip(jobs, results):
+            if result.status != 'processed':
+                continue
+            if file_path in digests:
+                manifest[_manifest_key(file_path, input_dir_path)] = digests[file_path]
+            else:
+                # Converted without hashing, so a recorded digest may describe other content than the new output
+                manifest.pop(_manifest_key(file_path, input_dir_path), None)
+        content_manifest.save_manifest(manifest_path, manifest)
 
     # Summary
     logger.info("Processing complete.")
-    logger.info(f"Summary: {processed_count} files processed, {skipped_count} files skipped (up-to-date), {failed_count} files failed")
-    
+    logger.info("Summary: %s files processed, %s files skipped (up-to-date), %s files failed", processed_count, skipped_count, failed_count)
+
     if connection_error_encountered and failed_count > 0:
         logger.error("")
         logger.error("=" * 70)
@@ -176,7 +573,7 @@ def process_directory():
         logger.error("  1. Start LM Studio application")
         logger.error("  2. Load a model (e.g., Gemma 3)")
         logger.error("  3. Enable the local server in LM Studio")
-        logger.error(f"  4. Verify the API URL in config.ini: {config.get('api_url')}")
+        logger.error("  4. Verify the API URL in config.ini: %s", config.get('api_url'))
         logger.error("")
         logger.error("Then run this script again.")
         logger.error("=" * 70)
@@ -0,0 +1,25 @@
+import pytest
+
+from src.config_handler import load_config
+
+@pytest.fixture(autouse=True)
+def clear_config_cache():
+    """load_config memoizes parsed files, so every test starts from an empty cache."""
+    load_config.cache_clear()
+    yield
+    load_config.cache_clear()
+
+@pytest.fixture
+def ini_loader(tmp_path):
+    """
+    Returns a function that writes INI content given as a string to a file in
+    tmp_path and runs load_config on it. Every call parses its content afresh.
+    """
+    config_file = tmp_path / "config.ini"
+
+    def _load(content: str):
+        config_file.write_text(content, encoding='utf-8')
+        load_config.cache_clear()
+        return load_config(str(config_file))
+
+    return _load
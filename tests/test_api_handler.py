@@ -1,34 +1,56 @@
 # Tests for src.api_handler
 import pytest
-from src.api_handler import call_llm_api
+from src.api_handler import call_llm_api, call_llm_api_batch, acall_llm_api, _get_session, new_async_client, set_connection_pool_size
+from src.api_handler import get_lmstudio_loaded_models, load_lmstudio_model
+from src import llm_cache
+import src.api_handler as src_api_handler
 import requests
+import httpx
+from urllib3.exceptions import ReadTimeoutError
+import asyncio
+import itertools
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import logging # For caplog
 
-# Add project root to sys.path for src imports
-import sys
-from pathlib import Path
-project_root = Path(__file__).resolve().parent.parent
-if str(project_root) not in sys.path:
-    sys.path.insert(0, str(project_root))
-
 SAMPLE_API_URL = "http://fake-lmstudio-api.com/v1/chat/completions"
 SAMPLE_TEXT_CONTENT = "This is a test document."
 EXPECTED_PROMPT_START = "Convert the following text to well-structured Markdown." # from api_handler default
 EXPECTED_SYSTEM_MESSAGE = "You are a helpful assistant that converts text to well-structured Markdown."
 
+def _json_body(data: dict) -> bytes:
+    """Encodes a fake API response body the way the server would send it."""
+    return json.dumps(data).encode('utf-8')
+
+def _sse_lines(*deltas: str) -> list[bytes]:
+    """Lines of an OpenAI-compatible event stream delivering the given content deltas."""
+    lines = [b'data: {"choices": [{"delta": {"role": "assistant"}}]}', b'']
+    for delta in deltas:
+        lines += [b'data: ' + _json_body({"choices": [{"delta": {"content": delta}}]}), b'']
+    return lines + [b'data: {"choices": [{"delta": {}, "finish_reason": "stop"}]}', b'', b'data: [DONE]', b'']
+
+def _ndjson_lines(*deltas: str) -> list[bytes]:
+    """Lines of an Ollama stream delivering the given content deltas."""
+    lines = [_json_body({"message": {"role": "assistant", "content": delta}, "done": False}) for delta in deltas]
+    return lines + [_json_body({"message": {"role": "assistant", "content": ""}, "done": True})]
+
 @pytest.fixture
 def mock_requests_post(mocker):
-    """Fixture to mock requests.post."""
-    return mocker.patch('requests.post')
+    """
+    Fixture to mock the post method of the shared requests.Session.
+    By default the mocked server answers with a plain (non-streamed) JSON body.
+    """
+    mock_post = mocker.patch('requests.Session.post')
+    mock_post.return_value.headers = {'Content-Type': 'application/json'}
+    return mock_post
 
 def test_call_lm_studio_api_success(mock_requests_post, caplog):
     """Test successful API call and Markdown content extraction."""
-    caplog.set_level(logging.INFO)
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
     expected_markdown = "## Test Markdown\n\n- Item 1"
-    mock_response.json.return_value = {
+    mock_response.content = _json_body({
         "choices": [
             {
                 "message": {
@@ -36,7 +58,7 @@ def test_call_lm_studio_api_success(mock_requests_post, caplog):
                 }
             }
         ]
-    }
+    })
 
     result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
 
@@ -44,10 +66,10 @@ def test_call_lm_studio_api_success(mock_requests_post, caplog):
     mock_requests_post.assert_called_once()
     args, kwargs = mock_requests_post.call_args
     assert args[0] == SAMPLE_API_URL
-    assert kwargs['headers']['Content-Type'] == 'application/json'
+    assert _get_session().headers['Content-Type'] == 'application/json'
     assert 'Authorization' not in kwargs['headers'] # No API key by default
 
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert payload['messages'][0]['role'] == 'system'
     assert payload['messages'][0]['content'] == EXPECTED_SYSTEM_MESSAGE
     assert payload['messages'][1]['role'] == 'user'
@@ -63,41 +85,41 @@ def test_call_lm_studio_api_with_model_identifier(mock_requests_post, mocker):
     mocker.patch('src.api_handler.get_lmstudio_loaded_models', return_value=['test-model-123'])
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "markdown"}}]}
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
     test_model_id = "test-model-123"
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier=test_model_id)
 
     mock_requests_post.assert_called_once()
     _, kwargs = mock_requests_post.call_args
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert payload['model'] == test_model_id
 
 def test_call_lm_studio_api_with_empty_model_identifier(mock_requests_post):
     """Test API call when model_identifier is an empty string."""
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "markdown"}}]}
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="")
 
     mock_requests_post.assert_called_once()
     _, kwargs = mock_requests_post.call_args
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert 'model' not in payload # Empty string should be treated as None/not provided
 
 def test_call_lm_studio_api_with_custom_system_prompt(mock_requests_post):
     """Test API call with custom system prompt."""
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "markdown"}}]}
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
     custom_prompt = "You are a specialized medical document formatter."
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', system_prompt=custom_prompt)
 
     mock_requests_post.assert_called_once()
     _, kwargs = mock_requests_post.call_args
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert payload['messages'][0]['role'] == 'system'
     assert payload['messages'][0]['content'] == custom_prompt
 
@@ -105,39 +127,39 @@ def test_call_lm_studio_api_with_custom_temperature(mock_requests_post):
     """Test API call with custom temperature."""
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "markdown"}}]}
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', temperature=0.3)
 
     mock_requests_post.assert_called_once()
     _, kwargs = mock_requests_post.call_args
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert payload['temperature'] == 0.3
 
 def test_call_lm_studio_api_with_max_tokens(mock_requests_post):
     """Test API call with max_tokens set."""
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "markdown"}}]}
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', max_tokens=2000)
 
     mock_requests_post.assert_called_once()
     _, kwargs = mock_requests_post.call_args
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert payload['max_tokens'] == 2000
 
 def test_call_lm_studio_api_without_max_tokens(mock_requests_post):
     """Test API call without max_tokens (should not be in payload)."""
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "markdown"}}]}
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', max_tokens=None)
 
     mock_requests_post.assert_called_once()
     _, kwargs = mock_requests_post.call_args
-    payload = kwargs['json']
+    payload = json.loads(kwargs['data'])
     assert 'max_tokens' not in payload
 
 def test_call_lm_studio_api_success_with_api_key(mock_requests_post):
@@ -145,9 +167,9 @@ def test_call_lm_studio_api_success_with_api_key(mock_requests_post):
     api_key = "test_api_key_123"
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
-    mock_response.json.return_value = {
+    mock_response.content = _json_body({
         "choices": [{"message": {"content": "markdown"}}]
-    }
+    })
 
     call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', api_key=api_key)
 
@@ -207,7 +229,7 @@ def test_call_lm_studio_api_json_decode_error(mock_requests_post, caplog):
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
     mock_response.text = "This is not valid JSON"
-    mock_response.json.side_effect = json.JSONDecodeError("Error decoding JSON", "doc", 0)
+    mock_response.content = b"This is not valid JSON"
 
     result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
 
@@ -220,7 +242,7 @@ def test_call_lm_studio_api_unexpected_response_structure(mock_requests_post, ca
     mock_response = mock_requests_post.return_value
     mock_response.status_code = 200
     response_json_data = {"not_choices": []}
-    mock_response.json.return_value = response_json_data
+    mock_response.content = _json_body(response_json_data)
     # Set .text attribute for when it's logged
     mock_response.text = json.dumps(response_json_data)
 
@@ -229,6 +251,45 @@ def test_call_lm_studio_api_unexpected_response_structure(mock_requests_post, ca
     assert result is None
     assert f"Unexpected response structure from lmstudio API at {SAMPLE_API_URL}. Full response: {json.dumps({'not_choices': []})}" in caplog.text
 
+def test_call_llm_api_null_content(mock_requests_post, caplog):
+    """Test that a null content field is reported as an unexpected response structure."""
+    caplog.set_level(logging.ERROR)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": None}}]})
+    mock_response.text = '{"choices": [{"message": {"content": null}}]}'
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
+
+    assert result is None
+    assert f"Unexpected response structure from lmstudio API at {SAMPLE_API_URL}." in caplog.text
+
+def test_call_ollama_api_success(mock_requests_post):
+    """Test successful Ollama API call and content extraction."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"message": {"role": "assistant", "content": " # Ollama Markdown\n"}})
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama', model_identifier="gemma3:4b")
+
+    assert result == "# Ollama Markdown"
+    _, kwargs = mock_requests_post.call_args
+    payload = json.loads(kwargs['data'])
+    assert payload['model'] == "gemma3:4b"
+    assert payload['options']['num_predict'] == -1
+
+def test_call_llm_api_server_type_is_case_insensitive(mock_requests_post):
+    """Test that a capitalized server type still selects the Ollama payload and response format."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"message": {"role": "assistant", "content": "# Ollama Markdown"}})
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'Ollama', model_identifier="gemma3:4b")
+
+    assert result == "# Ollama Markdown"
+    _, kwargs = mock_requests_post.call_args
+    assert 'options' in json.loads(kwargs['data'])
+
 def test_call_lm_studio_api_unexpected_exception(mock_requests_post, caplog):
     """Test handling of truly unexpected exceptions during the API call process."""
     caplog.set_level(logging.ERROR)
@@ -238,3 +299,513 @@ def test_call_lm_studio_api_unexpected_exception(mock_requests_post, caplog):
 
     assert result is None
     assert f"An unexpected error occurred during the API call to lmstudio API at {SAMPLE_API_URL}: A totally unexpected error!" in caplog.text
+
+@pytest.mark.parametrize("template", [
+    "Convert this:\n{text_content}\nThanks",
+    "{text_content}",
+    "Keep {{braces}} literal: {text_content}",
+    "Twice {text_content} and {text_content}",
+])
+def test_user_prompt_template_matches_str_format(mock_requests_post, template):
+    """Test that the precompiled template path builds the same prompt as str.format."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
+    text_with_braces = "Text with {braces} and {text_content} inside"
+
+    call_llm_api(text_with_braces, SAMPLE_API_URL, 'lmstudio', user_prompt_template=template)
+
+    _, kwargs = mock_requests_post.call_args
+    payload = json.loads(kwargs['data'])
+    assert payload['messages'][1]['content'] == template.format(text_content=text_with_braces)
+
+@pytest.mark.parametrize("server_type", ['lmstudio', 'ollama'])
+@pytest.mark.parametrize("text_content", [
+    SAMPLE_TEXT_CONTENT,
+    'Quotes " and \\ backslashes\n\ttabs, unicode üé中 and a control char \x01',
+    "",
+])
+def test_prepared_body_matches_fully_serialized_payload(server_type, text_content):
+    """Test that the pre-serialized payload template yields exactly what full serialization would."""
+    body, _ = src_api_handler._prepare_request(
+        text_content, server_type, None, "m", "System", "Before\n{text_content}\nAfter", 0.2, 100, 4096
+    )
+
+    messages = [
+        {"role": "system", "content": "System"},
+        {"role": "user", "content": "Before\n" + text_content + "\nAfter"}
+    ]
+    expected = src_api_handler._PAYLOAD_BUILDERS[server_type](messages, "m", 0.2, 100, 4096)
+    assert json.loads(body) == expected
+
+def test_prepared_body_with_sentinel_in_prompt():
+    """Test that a prompt containing the template sentinel itself falls back to full serialization."""
+    sentinel = src_api_handler._PAYLOAD_SENTINEL.decode()
+    body, _ = src_api_handler._prepare_request(
+        "doc", 'lmstudio', None, None, sentinel, "{text_content}", 0.7, None, 8192
+    )
+    payload = json.loads(body)
+    assert payload['messages'][0]['content'] == sentinel
+    assert payload['messages'][1]['content'] == "doc"
+
+@pytest.fixture
+def response_cache(tmp_path):
+    """Opens a temporary LLM response cache for the duration of a test."""
+    llm_cache.open_cache(str(tmp_path / "responses.sqlite3"))
+    yield
+    llm_cache.close_cache()
+
+def test_call_llm_api_uses_response_cache(mock_requests_post, response_cache, mocker):
+    """Test that an identical request is served from the response cache."""
+    m_ensure = mocker.patch('src.api_handler._ensure_lmstudio_model')
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": "cached markdown"}}]})
+
+    first = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="m", use_cache=True)
+    second = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="m", use_cache=True)
+    different = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="m", temperature=0.1, use_cache=True)
+
+    assert first == second == different == "cached markdown"
+    assert mock_requests_post.call_count == 2 # The changed temperature is a different request
+    assert m_ensure.call_count == 2 # A cache hit does not touch the server at all
+
+def test_call_llm_api_refresh_cache_skips_lookup(mock_requests_post, response_cache):
+    """Test that refresh_cache calls the API again and stores the new response."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": "old"}}]})
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', use_cache=True)
+
+    mock_response.content = _json_body({"choices": [{"message": {"content": "new"}}]})
+    refreshed = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', use_cache=True, refresh_cache=True)
+    cached = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', use_cache=True)
+
+    assert refreshed == cached == "new"
+    assert mock_requests_post.call_count == 2
+
+def test_call_llm_api_does_not_cache_failures(mock_requests_post, response_cache):
+    """Test that failed calls are not stored in the response cache."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 500
+    mock_response.text = "Internal Server Error"
+
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', use_cache=True)
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', use_cache=True)
+
+    assert mock_requests_post.call_count == 2
+
+def test_session_is_shared_and_isolates_api_keys(mock_requests_post):
+    """Test that calls reuse one session and API keys are sent per request only."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
+    session = _get_session()
+
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', api_key="first_key")
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
+
+    assert _get_session() is session
+    assert 'Authorization' not in session.headers
+    first_call, second_call = mock_requests_post.call_args_list
+    assert first_call.kwargs['headers']['Authorization'] == "Bearer first_key"
+    assert 'Authorization' not in second_call.kwargs['headers']
+
+def test_session_mounts_retrying_adapter():
+    """Test that the shared session retries transient gateway errors."""
+    adapter = _get_session().get_adapter(SAMPLE_API_URL)
+    assert adapter.max_retries.total == 3
+    assert 503 in adapter.max_retries.status_forcelist
+    assert "POST" in adapter.max_retries.allowed_methods
+    assert adapter.max_retries.read == 0 # A generation that failed midway is not resent
+    assert adapter.max_retries.raise_on_status is False # The last error response is reported as such
+
+def test_set_connection_pool_size_rebuilds_session():
+    """Test that the pool is resized by replacing the shared session."""
+    session = _get_session()
+    try:
+        set_connection_pool_size(8)
+        assert _get_session() is not session
+        assert _get_session().get_adapter(SAMPLE_API_URL)._pool_maxsize == 8
+    finally:
+        set_connection_pool_size(32)
+
+def test_new_async_client_retries_connects():
+    """Test that async clients also retry failed connection attempts."""
+    client = new_async_client(2)
+    assert client._transport._pool._retries == 3
+    assert client._transport._pool._max_connections == 2
+
+def test_call_llm_api_uses_separate_connect_and_read_timeouts(mock_requests_post):
+    """Test that connecting fails fast while the configured timeout applies to reading the response."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
+
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', timeout=120)
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', timeout=2)
+
+    first_call, second_call = mock_requests_post.call_args_list
+    assert first_call.kwargs['timeout'] == (5, 120)
+    assert second_call.kwargs['timeout'] == (2, 2)
+
+# --- Loaded Model Check Tests ---
+
+def test_loaded_models_are_cached_until_a_model_is_loaded(mocker):
+    """Test that /v1/models is queried once per TTL and again after loading a model."""
+    mocker.patch.dict(src_api_handler._loaded_models_cache, clear=True)
+    mock_get = mocker.patch('requests.Session.get')
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"data": [{"id": "model-a"}]}
+    mocker.patch('subprocess.run', return_value=mocker.MagicMock(returncode=0))
+    base_url = "http://localhost:1234"
+
+    assert get_lmstudio_loaded_models(base_url) == ["model-a"]
+    assert get_lmstudio_loaded_models(base_url) == ["model-a"]
+    assert mock_get.call_count == 1
+
+    assert load_lmstudio_model(base_url, "model-b")
+    get_lmstudio_loaded_models(base_url)
+    assert mock_get.call_count == 2
+
+    mocker.patch('time.monotonic', return_value=time.monotonic() + src_api_handler._LOADED_MODELS_TTL)
+    get_lmstudio_loaded_models(base_url)
+    assert mock_get.call_count == 3
+
+def test_loaded_models_failures_are_not_cached(mocker):
+    """Test that a failed /v1/models lookup is retried on the next call."""
+    mocker.patch.dict(src_api_handler._loaded_models_cache, clear=True)
+    mock_get = mocker.patch('requests.Session.get')
+    mock_get.return_value.status_code = 500
+
+    assert get_lmstudio_loaded_models("http://localhost:1234") == []
+    assert get_lmstudio_loaded_models("http://localhost:1234") == []
+    assert mock_get.call_count == 2
+
+def test_model_is_checked_once_until_server_reports_not_found(mock_requests_post, mocker):
+    """Test that the loaded-model check runs once per model, and after a 404 response queries the server and loads the model again."""
+    mocker.patch.object(src_api_handler, '_ensured_models', set())
+    mocker.patch.object(src_api_handler, '_failed_models', {})
+    mocker.patch.dict(src_api_handler._loaded_models_cache, clear=True)
+    mock_get = mocker.patch('requests.Session.get')
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"data": [{"id": "test-model"}]}
+    m_load = mocker.patch('src.api_handler.load_lmstudio_model', return_value=True)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
+
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="test-model")
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="test-model")
+    assert mock_get.call_count == 1
+
+    # The model was unloaded in the meantime, well within the TTL of the cached model list
+    mock_response.status_code = 404
+    mock_response.text = "model not found"
+    assert call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="test-model") is None
+    mock_get.return_value.json.return_value = {"data": []}
+
+    mock_response.status_code = 200
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', model_identifier="test-model")
+    assert mock_get.call_count == 2
+    m_load.assert_called_once()
+
+def test_concurrent_workers_load_the_model_once(mocker):
+    """Test that workers starting at the same moment share one model check and one 'lms load'."""
+    mocker.patch.object(src_api_handler, '_ensured_models', set())
+    mocker.patch.object(src_api_handler, '_failed_models', {})
+    mocker.patch('src.api_handler.get_lmstudio_loaded_models', return_value=[])
+    def slow_load(*args):
+        time.sleep(0.05)
+        return True
+    m_load = mocker.patch('src.api_handler.load_lmstudio_model', side_effect=slow_load)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: src_api_handler._ensure_lmstudio_model(SAMPLE_API_URL, "test-model", 8192), range(4)))
+
+    assert m_load.call_count == 1
+
+def test_failed_model_load_is_not_retried_within_ttl(mocker):
+    """Test that a failing 'lms load' is attempted once per TTL, however many workers need the model."""
+    mocker.patch.object(src_api_handler, '_ensured_models', set())
+    mocker.patch.object(src_api_handler, '_failed_models', {})
+    mocker.patch('src.api_handler.get_lmstudio_loaded_models', return_value=[])
+    m_load = mocker.patch('src.api_handler.load_lmstudio_model', return_value=False)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: src_api_handler._ensure_lmstudio_model(SAMPLE_API_URL, "test-model", 8192), range(8)))
+    assert m_load.call_count == 1
+
+    mocker.patch('time.monotonic', return_value=time.monotonic() + src_api_handler._LOADED_MODELS_TTL)
+    src_api_handler._ensure_lmstudio_model(SAMPLE_API_URL, "test-model", 8192)
+    assert m_load.call_count == 2
+
+# --- Batch Tests ---
+
+def test_call_llm_api_batch_marshals_documents(mocker):
+    """Test that documents are grouped into one prompt per batch and results mapped back by index."""
+    m_call = mocker.patch('src.api_handler.call_llm_api', side_effect=[
+        "```json\n" + json.dumps(["# A ", "# B"]) + "\n```",
+        "# C",
+    ])
+
+    results = list(call_llm_api_batch(["a", "b", "c"], SAMPLE_API_URL, 'lmstudio', batch_size=2, temperature=0.1))
+
+    assert results == [(0, "# A"), (1, "# B"), (2, "# C")]
+    assert m_call.call_count == 2
+    first_text, first_url, first_type = m_call.call_args_list[0].args
+    assert first_text == "===DOC 0===\na\n===DOC 1===\nb"
+    assert "JSON array of exactly 2 strings" in m_call.call_args_list[0].kwargs['user_prompt_template']
+    assert m_call.call_args_list[0].kwargs['temperature'] == 0.1
+
+def test_call_llm_api_batch_single_document_groups(mocker):
+    """Test that a group of one document is sent as a normal request."""
+    m_call = mocker.patch('src.api_handler.call_llm_api', side_effect=["# A", "# B"])
+
+    results = list(call_llm_api_batch(["a", "b"], SAMPLE_API_URL, 'lmstudio', batch_size=1))
+
+    assert results == [(0, "# A"), (1, "# B")]
+    assert m_call.call_args_list[0].args[0] == "a"
+    assert 'user_prompt_template' not in m_call.call_args_list[0].kwargs
+
+def test_call_llm_api_batch_truncated_response_falls_back(mocker, caplog):
+    """Test that documents missing from a cut-off answer are converted individually."""
+    m_call = mocker.patch('src.api_handler.call_llm_api', side_effect=[
+        '["# A", "# B with \\"quotes\\"", "# C cut o',
+        "# C individually",
+    ])
+
+    results = list(call_llm_api_batch(["a", "b", "c"], SAMPLE_API_URL, 'lmstudio', batch_size=3))
+
+    assert results == [(0, "# A"), (1, '# B with "quotes"'), (2, "# C individually")]
+    assert m_call.call_args_list[1].args[0] == "c"
+    assert "covered 2 of 3 documents" in caplog.text
+
+def test_call_llm_api_batch_unmappable_response_falls_back(mocker):
+    """Test that an answer with the wrong number of entries is not trusted."""
+    m_call = mocker.patch('src.api_handler.call_llm_api', side_effect=[json.dumps(["only one"]), "# A", "# B"])
+
+    results = list(call_llm_api_batch(["a", "b"], SAMPLE_API_URL, 'lmstudio', batch_size=2))
+
+    assert results == [(0, "# A"), (1, "# B")]
+    assert m_call.call_count == 3
+
+def test_call_llm_api_batch_failed_request(mocker):
+    """Test that a failed batch request marks all of its documents as failed without retrying."""
+    m_call = mocker.patch('src.api_handler.call_llm_api', return_value=None)
+
+    results = list(call_llm_api_batch(["a", "b"], SAMPLE_API_URL, 'lmstudio', batch_size=2))
+
+    assert results == [(0, None), (1, None)]
+    m_call.assert_called_once()
+
+# --- Streaming Tests ---
+
+def test_call_llm_api_requests_streaming(mock_requests_post):
+    """Test that both payload formats ask for a streamed response."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.content = _json_body({"message": {"content": "markdown"}})
+
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama')
+    mock_response.content = _json_body({"choices": [{"message": {"content": "markdown"}}]})
+    call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
+
+    for call in mock_requests_post.call_args_list:
+        assert json.loads(call.kwargs['data'])['stream'] is True
+        assert call.kwargs['stream'] is True
+
+def test_call_llm_api_assembles_sse_stream(mock_requests_post, caplog):
+    """Test that an OpenAI-compatible event stream is assembled into the Markdown content."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'text/event-stream'}
+    mock_response.iter_lines.return_value = _sse_lines("## Title", "\n\n- Item ", "1\n")
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
+
+    assert result == "## Title\n\n- Item 1"
+    mock_response.close.assert_called_once()
+    assert f"API call to lmstudio API at {SAMPLE_API_URL} successful, content received." in caplog.text
+
+def test_call_llm_api_assembles_ndjson_stream(mock_requests_post):
+    """Test that an Ollama NDJSON stream is assembled into the Markdown content."""
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'application/x-ndjson'}
+    mock_response.iter_lines.return_value = _ndjson_lines("# Über", " Markdown")
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama')
+
+    assert result == "# Über Markdown"
+
+def test_call_llm_api_stream_with_error_chunk(mock_requests_post, caplog):
+    """Test that an error object inside the stream is reported as an unexpected structure."""
+    caplog.set_level(logging.ERROR)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'application/x-ndjson'}
+    mock_response.iter_lines.return_value = [b'{"error": "model not found"}']
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama')
+
+    assert result is None
+    assert f"Unexpected response structure from ollama API at {SAMPLE_API_URL}." in caplog.text
+    assert "model not found" in caplog.text
+
+def test_call_llm_api_stream_with_invalid_json(mock_requests_post, caplog):
+    """Test handling of a stream chunk that is not valid JSON."""
+    caplog.set_level(logging.ERROR)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'text/event-stream'}
+    mock_response.iter_lines.return_value = [b'data: {"choices": [', b'']
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
+
+    assert result is None
+    assert f"Could not decode JSON chunk from lmstudio API at {SAMPLE_API_URL}." in caplog.text
+
+def test_call_llm_api_empty_stream(mock_requests_post, caplog):
+    """Test that a stream without any chunk is treated as a failure."""
+    caplog.set_level(logging.ERROR)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'text/event-stream'}
+    mock_response.iter_lines.return_value = [b'']
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio')
+
+    assert result is None
+    assert "The response stream was empty." in caplog.text
+
+def test_call_llm_api_stream_stops_at_overall_timeout(mock_requests_post, mocker, caplog):
+    """Test that api_timeout limits the whole streamed response, not only the gap between chunks."""
+    caplog.set_level(logging.ERROR)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'application/x-ndjson'}
+    mock_response.iter_lines.return_value = _ndjson_lines(*["again "] * 10)
+    # Every clock reading is 25 seconds later than the previous one
+    mocker.patch('src.api_handler.time.monotonic', side_effect=itertools.count(0, 25))
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama', timeout=60)
+
+    assert result is None
+    assert f"API request to ollama API at {SAMPLE_API_URL} timed out after 60 seconds." in caplog.text
+    mock_response.close.assert_called_once()
+
+def test_call_llm_api_stream_stall_is_reported_as_timeout(mock_requests_post, caplog):
+    """Test that a server going quiet mid-stream is reported as a timeout, not as a connection problem."""
+    caplog.set_level(logging.ERROR)
+    mock_response = mock_requests_post.return_value
+    mock_response.status_code = 200
+    mock_response.headers = {'Content-Type': 'text/event-stream'}
+
+    def stalled_stream():
+        yield from _sse_lines("## Title")[:2]
+        # What requests' iter_content raises when the read timeout expires
+        raise requests.exceptions.ConnectionError(ReadTimeoutError(None, SAMPLE_API_URL, "Read timed out."))
+    mock_response.iter_lines.return_value = stalled_stream()
+
+    result = call_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', timeout=1)
+
+    assert result is None
+    assert f"API request to lmstudio API at {SAMPLE_API_URL} timed out after 1 seconds." in caplog.text
+    assert "Cannot connect to" not in caplog.text
+
+# --- Async API Tests ---
+
+def _mock_async_client(mocker, handler):
+    """
+    Makes every httpx.AsyncClient created by the code under test send its
+    requests to handler instead of the network.
+    """
+    real_async_client = httpx.AsyncClient
+    requests_seen = []
+
+    def recording_handler(request):
+        requests_seen.append(request)
+        return handler(request)
+
+    mocker.patch('httpx.AsyncClient', side_effect=lambda **kwargs: real_async_client(**{**kwargs, 'transport': httpx.MockTransport(recording_handler)}))
+    return requests_seen
+
+def test_acall_llm_api_success(mocker):
+    """Test successful async API call with a streamed response."""
+    requests_seen = _mock_async_client(mocker, lambda request: httpx.Response(
+        200, headers={'Content-Type': 'text/event-stream'}, content=b"\n".join(_sse_lines("## Async ", "Markdown "))
+    ))
+
+    result = asyncio.run(acall_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', api_key="key"))
+
+    assert result == "## Async Markdown"
+    (request,) = requests_seen
+    assert str(request.url) == SAMPLE_API_URL
+    assert request.headers['Authorization'] == "Bearer key"
+    assert request.headers['Content-Type'] == 'application/json'
+    assert SAMPLE_TEXT_CONTENT in json.loads(request.content)['messages'][1]['content']
+
+def test_acall_llm_api_ollama_payload(mocker):
+    """Test that the async call builds the Ollama payload and parses a plain JSON response."""
+    requests_seen = _mock_async_client(mocker, lambda request: httpx.Response(
+        200, json={"message": {"content": "ollama markdown"}}
+    ))
+
+    result = asyncio.run(acall_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama', model_identifier="gemma3:4b", max_tokens=100))
+
+    assert result == "ollama markdown"
+    payload = json.loads(requests_seen[0].content)
+    assert payload['model'] == "gemma3:4b"
+    assert payload['options']['num_predict'] == 100
+
+def test_acall_llm_api_http_error(mocker, caplog):
+    """Test handling of non-200 status codes in the async call."""
+    caplog.set_level(logging.ERROR)
+    _mock_async_client(mocker, lambda request: httpx.Response(500, text="Internal Server Error"))
+
+    result = asyncio.run(acall_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio'))
+
+    assert result is None
+    assert f"API request to lmstudio API at {SAMPLE_API_URL} failed with status code 500. Response: Internal Server Error" in caplog.text
+
+def test_acall_llm_api_connection_error(mocker, caplog):
+    """Test handling of httpx.ConnectError in the async call."""
+    caplog.set_level(logging.ERROR)
+
+    def refuse(request):
+        raise httpx.ConnectError("Connection refused")
+
+    _mock_async_client(mocker, refuse)
+
+    result = asyncio.run(acall_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio'))
+
+    assert result is None
+    assert f"Cannot connect to lmstudio API at {SAMPLE_API_URL}" in caplog.text
+
+def test_acall_llm_api_timeout(mocker, caplog):
+    """Test handling of httpx timeouts in the async call."""
+    caplog.set_level(logging.ERROR)
+
+    def time_out(request):
+        raise httpx.ReadTimeout("Read timed out")
+
+    _mock_async_client(mocker, time_out)
+
+    result = asyncio.run(acall_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'lmstudio', timeout=5))
+
+    assert result is None
+    assert f"API request to lmstudio API at {SAMPLE_API_URL} timed out after 5 seconds." in caplog.text
+
+def test_acall_llm_api_stream_stops_at_overall_timeout(mocker, caplog):
+    """Test that api_timeout limits the whole streamed response of an async call as well."""
+    caplog.set_level(logging.ERROR)
+    _mock_async_client(mocker, lambda request: httpx.Response(
+        200, headers={'Content-Type': 'application/x-ndjson'}, content=b"\n".join(_ndjson_lines(*["again "] * 10))
+    ))
+    mocker.patch('src.api_handler.time.monotonic', side_effect=itertools.count(0, 25))
+
+    result = asyncio.run(acall_llm_api(SAMPLE_TEXT_CONTENT, SAMPLE_API_URL, 'ollama', timeout=60))
+
+    assert result is None
+    assert f"API request to ollama API at {SAMPLE_API_URL} timed out after 60 seconds." in caplog.text
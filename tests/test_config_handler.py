@@ -2,40 +2,41 @@
 import pytest
 from src.config_handler import load_config, DEFAULT_CONFIG_PATH
 import configparser
-from unittest.mock import mock_open, patch
-
-# Add project root to sys.path for src imports
-import sys
-from pathlib import Path
-project_root = Path(__file__).resolve().parent.parent
-if str(project_root) not in sys.path:
-    sys.path.insert(0, str(project_root))
-
-# Define a fixture for default expected config to reduce repetition
-@pytest.fixture
-def default_expected_config():
-    return {
-        'type': 'lmstudio',
-        'api_url': 'http://localhost:1234/v1/chat/completions',
-        'input_dir': 'data/input',
-        'output_dir': 'data/output',
-        'api_key': None,
-        'api_timeout': 60, # Default timeout
-        'log_file': 'app.log',
-        'log_level': 'INFO',
-        'model_identifier': None,
-        'system_prompt': None,
-        'user_prompt_template': None,
-        'temperature': 0.7,
-        'max_tokens': None,
-        'context_length': 8192,
-        'caching_enabled': True,
-        'caching_force_reprocess_all': False
-    }
-
-def test_load_config_success(mocker, default_expected_config):
-    """Test successful loading of a complete config file."""
-    mock_content = """
+import os
+import re
+from types import MappingProxyType
+
+# Default expected config, shared read-only by all tests (copy with dict() to modify)
+DEFAULT_EXPECTED_CONFIG = MappingProxyType({
+    'type': 'lmstudio',
+    'api_url': 'http://localhost:1234/v1/chat/completions',
+    'input_dir': 'data/input',
+    'output_dir': 'data/output',
+    'api_key': None,
+    'api_timeout': 60, # Default timeout
+    'log_file': 'app.log',
+    'log_level': 'INFO',
+    'model_identifier': None,
+    'system_prompt': None,
+    'user_prompt_template': None,
+    'temperature': 0.7,
+    'max_concurrency': 4,
+    'use_asyncio': False,
+    'batch_size': 1,
+    'max_tokens': None,
+    'context_length': 8192,
+    'caching_enabled': True,
+    'caching_force_reprocess_all': False,
+    'caching_response_cache': True,
+    'caching_response_cache_file': '.llm_cache.sqlite3',
+    'caching_response_cache_any_temperature': False,
+    'caching_content_manifest': False
+})
+
+# INI contents used by the tests below
+
+# Only the essential sections and keys
+_INI_MINIMAL = """
 [Server]
 type = lmstudio
 
@@ -45,50 +46,31 @@ api_url = http://localhost:1234/v1/chat/completions
 [Directories]
 input_dir = data/input
 output_dir = data/output
+"""
 
+# The essential settings plus a [Logging] section; api_key and api_timeout are missing
+_INI_WITH_LOGGING = _INI_MINIMAL + """
 [Logging]
 log_file = app.log
 log_level = INFO
+"""
 
+_INI_FULL = _INI_WITH_LOGGING + """
 [Caching]
 enabled = true
 force_reprocess_all = false
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
+"""
 
-    config = load_config('dummy_path.ini') # Path doesn't matter due to mock
-    # Create a local expected config that matches the mock_content, as default_expected_config now has model_identifier=None
-    expected_config_here = default_expected_config.copy()
-    # model_identifier is not in mock_content, so it should be None (matching default_expected_config)
-    # caching flags are in mock_content and match defaults.
-    assert config == expected_config_here
-
-def test_load_config_file_not_found(mocker):
-    """Test FileNotFoundError when config file does not exist."""
-    mocker.patch('os.path.exists', return_value=False)
-    with pytest.raises(FileNotFoundError, match="Configuration file not found: non_existent.ini"):
-        load_config('non_existent.ini')
-
-def test_load_config_missing_section(mocker):
-    """Test ValueError when an essential section is missing."""
-    mock_content = """
+_INI_MISSING_LMSTUDIO = """
 [Server]
 type = lmstudio
 
 [Directories]
 input_dir = data/input
 output_dir = data/output
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
-
-    with pytest.raises(ValueError, match="Missing section \\[LMStudio\\]"):
-        load_config('dummy_path.ini')
+"""
 
-def test_load_config_missing_essential_key(mocker):
-    """Test ValueError when an essential key is missing."""
-    mock_content = """
+_INI_MISSING_API_URL = """
 [Server]
 type = lmstudio
 
@@ -98,82 +80,20 @@ type = lmstudio
 [Directories]
 input_dir = data/input
 output_dir = data/output
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
-
-    with pytest.raises(ValueError, match="Missing key 'api_url' in section \\[LMStudio\\]"):
-        load_config('dummy_path.ini')
-
-def test_load_config_default_api_key(mocker, default_expected_config):
-    """Test that api_key defaults to None if not provided."""
-    mock_content = """
-[Server]
-type = lmstudio
-
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-
-[Directories]
-input_dir = data/input
-output_dir = data/output
-
-[Logging]
-log_file = app.log
-log_level = INFO
-    """
-    # api_key is missing in mock_content
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
-
-    config = load_config('dummy_path.ini')
-    assert config['api_key'] is None
-    assert config['api_url'] == default_expected_config['api_url'] # Check others remain same
-
-def test_load_config_default_logging_settings(mocker, default_expected_config):
-    """Test that log_file and log_level use defaults if [Logging] is missing or keys are missing."""
-    mock_content_no_logging_section = """
-[Server]
-type = lmstudio
-
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-
-[Directories]
-input_dir = data/input
-output_dir = data/output
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_no_logging_section))
-
-    config = load_config('dummy_path.ini')
-    assert config['log_file'] == default_expected_config['log_file'] # 'app.log'
-    assert config['log_level'] == default_expected_config['log_level'] # 'INFO'
-    assert config['api_timeout'] == 60 # Check default timeout
-
-    mock_content_partial_logging = """
-[Server]
-type = lmstudio
-
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-
-[Directories]
-input_dir = data/input
-output_dir = data/output
+"""
 
+_INI_PARTIAL_LOGGING = _INI_MINIMAL + """
 [Logging]
 # log_file is present, log_level is missing
 log_file = specific.log
-    """
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_partial_logging))
-    config_partial = load_config('dummy_path.ini')
-    assert config_partial['log_file'] == 'specific.log'
-    assert config_partial['log_level'] == default_expected_config['log_level'] # 'INFO' (default)
-
-def test_load_config_custom_settings(mocker):
-    """Test loading of custom (non-default) settings."""
-    mock_content = """
+"""
+
+_INI_CUSTOM = """
+[General]
+max_concurrency = 2
+use_asyncio = true
+batch_size = 3
+
 [Server]
 type = lmstudio
 
@@ -197,78 +117,26 @@ log_level = DEBUG
 [Caching]
 enabled = false
 force_reprocess_all = true
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
-
-    expected_custom_config = {
-        'type': 'lmstudio',
-        'api_url': 'http://my.server:5678/v1/custom',
-        'input_dir': 'custom/in',
-        'output_dir': 'custom/out',
-        'api_key': 'mysecretkey',
-        'api_timeout': 150,
-        'log_file': 'my_app.log',
-        'log_level': 'DEBUG',
-        'model_identifier': 'test-model-custom',
-        'system_prompt': 'Custom system prompt for testing',
-        'user_prompt_template': None,
-        'temperature': 0.3,
-        'max_tokens': 4000,
-        'context_length': 8192,
-        'caching_enabled': False,
-        'caching_force_reprocess_all': True
-    }
-    config = load_config('dummy_path.ini')
-    assert config == expected_custom_config
-
-def test_load_config_model_identifier_handling(mocker, default_expected_config):
-    """Test handling of model_identifier (present, absent)."""
-    # Case 1: model_identifier is present
-    mock_content_with_model_id = """
-[Server]
-type = lmstudio
+response_cache = false
+response_cache_file = cache/responses.db
+response_cache_any_temperature = true
+content_manifest = true
+"""
 
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-model_identifier = specific-model-test
-
-[Directories]
-input_dir = data/input
-output_dir = data/output
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_with_model_id))
-
-    config = load_config('dummy_path.ini')
-    expected_config = default_expected_config.copy()
-    expected_config['model_identifier'] = 'specific-model-test'
-    # Caching flags will take their default values as they are not in mock_content_with_model_id
-    # These defaults are already in default_expected_config, so no change needed for them here.
-    assert config['model_identifier'] == 'specific-model-test'
-    assert config['api_url'] == expected_config['api_url'] # Check a few other keys
-
-    # Case 2: model_identifier is absent (should default to None)
-    mock_content_without_model_id = """
+_INI_WITH_MODEL_ID = """
 [Server]
 type = lmstudio
 
 [LMStudio]
 api_url = http://localhost:1234/v1/chat/completions
+model_identifier = specific-model-test
 
 [Directories]
 input_dir = data/input
 output_dir = data/output
-    """
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_without_model_id))
-    config_no_model = load_config('dummy_path.ini')
-    assert config_no_model['model_identifier'] is None # Explicitly from default_expected_config
-    assert config_no_model['api_url'] == default_expected_config['api_url']
+"""
 
-
-def test_load_config_with_api_timeout(mocker, default_expected_config):
-    """Test loading config with a specific api_timeout."""
-    mock_content = """
+_INI_WITH_API_TIMEOUT = """
 [Server]
 type = lmstudio
 
@@ -283,144 +151,204 @@ output_dir = data/output
 [Logging]
 log_file = app.log
 log_level = INFO
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
-
-    config = load_config('dummy_path.ini')
-    expected_config = default_expected_config.copy()
-    expected_config['api_timeout'] = 150
-    assert config['api_timeout'] == 150
-    assert config['api_url'] == expected_config['api_url'] # ensure others are fine
+"""
 
-
-def test_load_config_without_api_timeout(mocker, default_expected_config):
-    """Test loading config without api_timeout, expecting default."""
-    mock_content = """
-[Server]
-type = lmstudio
-
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-# api_timeout is missing
-
-[Directories]
-input_dir = data/input
-output_dir = data/output
-
-[Logging]
-log_file = app.log
-log_level = INFO
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content))
-
-    config = load_config('dummy_path.ini')
-    assert config['api_timeout'] == 60 # Default value
-    assert config['api_url'] == default_expected_config['api_url'] # ensure others are fine
-
-def test_load_config_log_level_case_insensitivity(mocker, default_expected_config):
-    """Test that log_level is case-insensitive and defaults to INFO for invalid values."""
-    mock_content_debug_lower = """
-[Server]
-type = lmstudio
-
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-[Directories]
-input_dir = data/input
-output_dir = data/output
+_INI_LOG_LEVEL_LOWER_CASE = _INI_MINIMAL + """
 [Logging]
 log_level = debug
-    """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_debug_lower))
-    config = load_config('dummy_path.ini')
-    assert config['log_level'] == 'DEBUG'
+"""
 
-    mock_content_invalid_level = """
-[Server]
-type = lmstudio
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-[Directories]
-input_dir = data/input
-output_dir = data/output
+_INI_LOG_LEVEL_INVALID = _INI_MINIMAL + """
 [Logging]
 log_level = FANCYPANTS
-    """
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_invalid_level))
-    config = load_config('dummy_path.ini')
-    # The config_handler currently defaults invalid levels to INFO without logging a warning at its stage
-    assert config['log_level'] == 'INFO'
-
-    # Check that an empty log_level also defaults to INFO
-    mock_content_empty_level = """
-[Server]
-type = lmstudio
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-[Directories]
-input_dir = data/input
-output_dir = data/output
+"""
+
+_INI_LOG_LEVEL_EMPTY = _INI_MINIMAL + """
 [Logging]
 log_level =
-    """
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_empty_level))
-    config = load_config('dummy_path.ini')
-    assert config['log_level'] == 'INFO' # Assuming get with fallback handles empty string by defaulting
-                                         # configparser might treat empty value as empty string,
-                                         # so load_config's .upper() and then check in valid_log_levels matters.
-                                         # '' is not in valid_log_levels, so it defaults to INFO.
-                                         # This is correct.
-
-    # Test that log_file defaults if empty
-    mock_content_empty_log_file = """
-[Server]
-type = lmstudio
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
-[Directories]
-input_dir = data/input
-output_dir = data/output
+"""
+
+_INI_LOG_FILE_EMPTY = _INI_MINIMAL + """
 [Logging]
 log_file =
 log_level = INFO
-    """
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_empty_log_file))
-    config = load_config('dummy_path.ini')
-    # config.get('Logging', 'log_file', fallback='app.log') -> if '' is value, it's taken as is.
-    # This might be an edge case. The current config_handler would return '' for log_file.
-    # Let's verify current behavior. Yes, it will be an empty string.
-    # This is acceptable; an empty log_file path might be handled by the logger setup (e.g., error or default).
-    # The logger.py uses project_root / log_file_str. If log_file_str is empty, it becomes project_root.
-    # This would cause logging to a directory, which is an error.
-    # The config_handler should ideally ensure log_file is not empty or logger.py handles it.
-    # For now, test current behavior:
-    assert config['log_file'] == '' # Current behavior
-    # A better behavior might be to default to 'app.log' if an empty string is provided.
-    # This would require a change in config_handler.py:
-    # loaded_config['log_file'] = config.get('Logging', 'log_file') or 'app.log'
-
-    # For this test suite, we test the *current* implementation.
-    # If the above behavior for empty log_file is undesirable, a new subtask/issue would address it.
-    # The current config_handler.py:
-    # loaded_config['log_file'] = config.get('Logging', 'log_file', fallback='app.log')
-    # This means if 'log_file' key is missing, it's 'app.log'. If 'log_file =', it's an empty string.
-    # This is fine.
-
-    # Final check for default log_file when key itself is missing under [Logging]
-    mock_content_missing_log_file_key = """
+"""
+
+_INI_LOG_FILE_MISSING = _INI_MINIMAL + """
+[Logging]
+log_level = INFO
+"""
+
+_INI_PROMPTS_AND_BOOLEANS = """
 [Server]
-type = lmstudio
-[LMStudio]
-api_url = http://localhost:1234/v1/chat/completions
+type = ollama
+
+[General]
+system_prompt = General system prompt, 100% literal with %(no)s interpolation
+
+[Ollama]
+api_url = http://localhost:11434/api/chat
+system_prompt = Ollama system prompt
+user_prompt_template = Ollama template {text_content}
+
 [Directories]
 input_dir = data/input
 output_dir = data/output
-[Logging]
-log_level = INFO
-    """
-    mocker.patch('builtins.open', mock_open(read_data=mock_content_missing_log_file_key))
-    config = load_config('dummy_path.ini')
-    assert config['log_file'] == default_expected_config['log_file'] # 'app.log'
+
+[Caching]
+enabled = off
+force_reprocess_all = yes
+"""
+
+_EXPECTED_CUSTOM = {
+    'type': 'lmstudio',
+    'api_url': 'http://my.server:5678/v1/custom',
+    'input_dir': 'custom/in',
+    'output_dir': 'custom/out',
+    'api_key': 'mysecretkey',
+    'api_timeout': 150,
+    'log_file': 'my_app.log',
+    'log_level': 'DEBUG',
+    'model_identifier': 'test-model-custom',
+    'system_prompt': 'Custom system prompt for testing',
+    'user_prompt_template': None,
+    'temperature': 0.3,
+    'max_concurrency': 2,
+    'use_asyncio': True,
+    'batch_size': 3,
+    'max_tokens': 4000,
+    'context_length': 8192,
+    'caching_enabled': False,
+    'caching_force_reprocess_all': True,
+    'caching_response_cache': False,
+    'caching_response_cache_file': 'cache/responses.db',
+    'caching_response_cache_any_temperature': True,
+    'caching_content_manifest': True
+}
+
+# Expected error messages of the load_config error-path tests
+_ERR_MISSING_LMSTUDIO = re.compile(r"Missing section \[LMStudio\]")
+_ERR_MISSING_API_URL = re.compile(r"Missing key 'api_url' in section \[LMStudio\]")
+_ERR_INVALID_SERVER_TYPE = re.compile(r"Invalid server type 'vllm'")
+_ERR_NOT_POSITIVE = re.compile(r"Invalid (max_concurrency|batch_size) (0|-1) .*must be at least 1")
+
+def test_load_config_file_not_found(mocker):
+    """Test FileNotFoundError when config file does not exist."""
+    mocker.patch('os.path.exists', return_value=False)
+    with pytest.raises(FileNotFoundError, match="Configuration file not found: non_existent.ini"):
+        load_config('non_existent.ini')
+
+def test_load_config_unreadable_file(tmp_path):
+    """Test ValueError when the config path exists but cannot be read, e.g. because it is a directory."""
+    with pytest.raises(ValueError, match="Could not read configuration file"):
+        load_config(str(tmp_path))
+
+def test_load_config_missing_section(ini_loader):
+    """Test ValueError when an essential section is missing."""
+    with pytest.raises(ValueError, match=_ERR_MISSING_LMSTUDIO):
+        ini_loader(_INI_MISSING_LMSTUDIO)
+
+def test_load_config_missing_essential_key(ini_loader):
+    """Test ValueError when an essential key is missing."""
+    with pytest.raises(ValueError, match=_ERR_MISSING_API_URL):
+        ini_loader(_INI_MISSING_API_URL)
+
+def test_load_config_invalid_server_type(ini_loader):
+    """Test ValueError when [Server] type names an unsupported server."""
+    with pytest.raises(ValueError, match=_ERR_INVALID_SERVER_TYPE):
+        ini_loader(_INI_MINIMAL.replace("type = lmstudio", "type = vLLM"))
+
+@pytest.mark.parametrize("general", [
+    "max_concurrency = 0",
+    "batch_size = 0",
+    "max_concurrency = -1",
+], ids=["zero_concurrency", "zero_batch_size", "negative_concurrency"])
+def test_load_config_rejects_settings_below_one(ini_loader, general):
+    """Test ValueError when max_concurrency or batch_size would leave no worker or no document per request."""
+    with pytest.raises(ValueError, match=_ERR_NOT_POSITIVE):
+        ini_loader(_INI_MINIMAL + f"\n[General]\n{general}\n")
+
+# (id, INI content, expected configuration) for the files load_config should accept
+LOAD_CONFIG_CASES = [
+    # model_identifier is not in the file, so it is None; the caching flags match the defaults
+    ("full", _INI_FULL, DEFAULT_EXPECTED_CONFIG),
+    ("custom", _INI_CUSTOM, _EXPECTED_CUSTOM),
+    # api_key defaults to None, api_timeout to 60
+    ("no_api_key_or_timeout", _INI_WITH_LOGGING, DEFAULT_EXPECTED_CONFIG),
+    ("api_timeout", _INI_WITH_API_TIMEOUT, {**DEFAULT_EXPECTED_CONFIG, 'api_timeout': 150}),
+    # log_file and log_level use defaults if [Logging] or one of its keys is missing
+    ("no_logging_section", _INI_MINIMAL, DEFAULT_EXPECTED_CONFIG),
+    ("partial_logging", _INI_PARTIAL_LOGGING, {**DEFAULT_EXPECTED_CONFIG, 'log_file': 'specific.log'}),
+    ("model_identifier", _INI_WITH_MODEL_ID, {**DEFAULT_EXPECTED_CONFIG, 'model_identifier': 'specific-model-test'}),
+]
+
+@pytest.mark.parametrize("name, ini, expected", LOAD_CONFIG_CASES, ids=[case[0] for case in LOAD_CONFIG_CASES])
+def test_load_config_variants(ini_loader, name, ini, expected):
+    """Test that each valid config file yields exactly the expected settings."""
+    assert ini_loader(ini) == expected
+
+@pytest.mark.parametrize("ini, expected_log_level", [
+    (_INI_LOG_LEVEL_LOWER_CASE, 'DEBUG'),
+    # The config_handler defaults invalid levels to INFO without logging a warning at its stage
+    (_INI_LOG_LEVEL_INVALID, 'INFO'),
+    # An empty value is read as '', which is not a valid level either
+    (_INI_LOG_LEVEL_EMPTY, 'INFO'),
+], ids=["lower_case", "invalid", "empty"])
+def test_load_config_log_level_case_insensitivity(ini_loader, ini, expected_log_level):
+    """Test that log_level is case-insensitive and defaults to INFO for invalid values."""
+    assert ini_loader(ini)['log_level'] == expected_log_level
+
+@pytest.mark.parametrize("ini, expected_log_file", [
+    # 'log_file =' is taken as is; only a missing key falls back to app.log.
+    # (logger.setup_logging then logs to the console only, see its handling of an unusable log file)
+    (_INI_LOG_FILE_EMPTY, ''),
+    (_INI_LOG_FILE_MISSING, DEFAULT_EXPECTED_CONFIG['log_file']),
+], ids=["empty", "missing_key"])
+def test_load_config_log_file_fallback(ini_loader, ini, expected_log_file):
+    """Test that log_file defaults to app.log only if the key is missing."""
+    assert ini_loader(ini)['log_file'] == expected_log_file
+
+def test_load_config_is_memoized(tmp_path, mocker):
+    """Repeated loads of the same file return the same read-only mapping without re-reading it."""
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(_INI_MINIMAL)
+    m_open = mocker.patch('src.config_handler.open', create=True, wraps=open)
+
+    config = load_config(str(config_file))
+    assert load_config(os.path.relpath(config_file)) is config
+    assert m_open.call_count == 1
+
+    with pytest.raises(TypeError):
+        config['input_dir'] = 'elsewhere'
+
+    load_config.cache_clear()
+    assert load_config(str(config_file)) is not config
+    assert m_open.call_count == 2
+
+def test_load_config_prompt_precedence_and_boolean_spellings(ini_loader):
+    """[General] prompts win over the API section's and are read literally; booleans accept the ConfigParser spellings."""
+    config = ini_loader(_INI_PROMPTS_AND_BOOLEANS)
+    assert config['system_prompt'] == 'General system prompt, 100% literal with %(no)s interpolation'
+    assert config['user_prompt_template'] == 'Ollama template {text_content}'
+    assert config['caching_enabled'] is False
+    assert config['caching_force_reprocess_all'] is True
+    assert config['caching_response_cache'] is True
+
+def test_load_config_rereads_changed_file(tmp_path):
+    """An edited configuration file is parsed again without clearing the cache."""
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(_INI_MINIMAL)
+    config = load_config(str(config_file))
+    assert load_config(str(config_file)) is config
+
+    config_file.write_text(_INI_MINIMAL.replace("data/output", "data/markdown"))
+    os.utime(config_file, ns=(config_file.stat().st_mtime_ns + 1_000_000,) * 2)
+
+    assert load_config(str(config_file))['output_dir'] == "data/markdown"
+
+def test_load_config_reads_utf8(tmp_path):
+    """The configuration file is decoded as UTF-8, so prompts may use any language."""
+    config_file = tmp_path / "config.ini"
+    config_file.write_bytes((_INI_MINIMAL + "\n[General]\nsystem_prompt = Überschriften als ## setzen – ohne Kommentar\n").encode('utf-8'))
+
+    assert load_config(str(config_file))['system_prompt'] == "Überschriften als ## setzen – ohne Kommentar"
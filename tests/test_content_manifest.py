@@ -0,0 +1,38 @@
+# Tests for src.content_manifest
+import hashlib
+from src import content_manifest
+
+def test_save_and_load_roundtrip(tmp_path):
+    """Test that a saved manifest is loaded back unchanged."""
+    manifest_path = str(tmp_path / content_manifest.MANIFEST_FILE)
+    content_manifest.save_manifest(manifest_path, {"a.txt": "00ff", "sub/b.txt": "abcd"})
+
+    assert content_manifest.load_manifest(manifest_path) == {"a.txt": "00ff", "sub/b.txt": "abcd"}
+    assert not (tmp_path / (content_manifest.MANIFEST_FILE + ".tmp")).exists()
+
+def test_load_missing_manifest_is_empty(tmp_path):
+    """Test that a run without a manifest starts with an empty one."""
+    assert content_manifest.load_manifest(str(tmp_path / "missing.json")) == {}
+
+def test_load_corrupt_manifest_is_empty(tmp_path, caplog):
+    """Test that an unreadable manifest is ignored with a warning."""
+    manifest_path = tmp_path / content_manifest.MANIFEST_FILE
+    manifest_path.write_text("{not json")
+
+    assert content_manifest.load_manifest(str(manifest_path)) == {}
+    assert "Could not read content manifest" in caplog.text
+
+def test_file_digest_is_sha256_of_raw_bytes(tmp_path):
+    """Test that the digest covers the bytes on disk, including line endings."""
+    file_path = tmp_path / "doc.txt"
+    file_path.write_bytes(b"line one\r\nline two")
+
+    assert content_manifest.file_digest(str(file_path)) == hashlib.sha256(b"line one\r\nline two").hexdigest()
+
+def test_file_digest_spans_several_chunks(tmp_path, monkeypatch):
+    """Test that a file longer than one read chunk is hashed completely."""
+    monkeypatch.setattr(content_manifest, '_CHUNK_SIZE', 4)
+    file_path = tmp_path / "doc.txt"
+    file_path.write_bytes(b"0123456789")
+
+    assert content_manifest.file_digest(str(file_path)) == hashlib.sha256(b"0123456789").hexdigest()
@@ -0,0 +1,53 @@
+# Tests for src.llm_cache
+import pytest
+from src import llm_cache
+
+@pytest.fixture
+def open_cache(tmp_path):
+    """Opens a cache database in a temporary directory and closes it afterwards."""
+    cache_path = tmp_path / "cache.sqlite3"
+    llm_cache.open_cache(str(cache_path))
+    yield cache_path
+    llm_cache.close_cache()
+
+def test_put_and_get_roundtrip(open_cache):
+    """Test that a stored response is returned for the same key."""
+    key = llm_cache.make_key("http://api", b'{"messages": []}')
+    assert llm_cache.get(key) is None
+
+    llm_cache.put(key, "# Cached Markdown")
+
+    assert llm_cache.get(key) == "# Cached Markdown"
+
+def test_put_overwrites_existing_entry(open_cache):
+    """Test that storing a response again replaces the old one."""
+    llm_cache.put("key", "old")
+    llm_cache.put("key", "new")
+    assert llm_cache.get("key") == "new"
+
+def test_cache_persists_across_reopen(open_cache):
+    """Test that responses survive closing and reopening the database."""
+    llm_cache.put("key", "persisted")
+    llm_cache.close_cache()
+
+    llm_cache.open_cache(str(open_cache))
+
+    assert llm_cache.get("key") == "persisted"
+
+def test_get_and_put_without_open_cache():
+    """Test that the cache is a no-op until it has been opened."""
+    llm_cache.close_cache()
+    llm_cache.put("key", "value")
+    assert llm_cache.get("key") is None
+
+def test_make_key_is_deterministic_and_separates_parts():
+    """Test key stability and that part boundaries matter."""
+    assert llm_cache.make_key("a", b"b") == llm_cache.make_key("a", "b")
+    assert llm_cache.make_key("ab", "c") != llm_cache.make_key("a", "bc")
+    assert len(llm_cache.make_key("x")) == 32
+
+def test_open_cache_failure_is_logged(tmp_path, caplog):
+    """Test that an unusable cache path disables the cache instead of raising."""
+    llm_cache.open_cache(str(tmp_path / "missing_dir" / "cache.sqlite3"))
+    assert "Could not open LLM response cache" in caplog.text
+    assert llm_cache.get("key") is None
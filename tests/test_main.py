@@ -1,19 +1,36 @@
 # Tests for src.main
 import pytest
 from pathlib import Path
-from src.main import process_directory
+from src.main import create_output_dirs, process_directory, iter_txt_files, _output_path_for
+import src.main as src_main
+import os
 import logging
-
-# Add project root to sys.path for src imports
-import sys
-project_root_path = Path(__file__).resolve().parent.parent
-if str(project_root_path) not in sys.path:
-    sys.path.insert(0, str(project_root_path))
+import threading
+import time
+from types import MappingProxyType
+from unittest.mock import call
 
 # Since main.py calls setup_logging() which configures root,
 # ensure tests don't interfere if they also try to configure.
 # logger.py's setup_logging has a guard against multiple handler additions.
 
+# The settings of mock_config_valid that do not depend on tmp_path, shared read-only by all tests
+_BASE_CONFIG = MappingProxyType({
+    'type': 'lmstudio',
+    'api_url': 'http://fake-api.com',
+    'api_key': None,
+    'api_timeout': 60,
+    'log_level': 'DEBUG',
+    'model_identifier': None,
+    'system_prompt': None,
+    'user_prompt_template': None,
+    'temperature': 0.7,
+    'max_tokens': None,
+    'caching_enabled': True,
+    'caching_force_reprocess_all': False,
+    'caching_response_cache': True # Not used at temperature 0.7
+})
+
 @pytest.fixture
 def mock_config_valid(tmp_path):
     """Provides a valid configuration pointing to temp directories."""
@@ -22,21 +39,10 @@ def mock_config_valid(tmp_path):
     input_dir.mkdir()
     output_dir.mkdir() # process_directory will also try to create it, exist_ok=True handles this
     return {
-        'type': 'lmstudio',
-        'api_url': 'http://fake-api.com',
-        'api_key': None,
+        **_BASE_CONFIG,
         'input_dir': str(input_dir),
         'output_dir': str(output_dir),
-        'api_timeout': 60,
-        'log_file': str(tmp_path / 'test_app.log'),
-        'log_level': 'DEBUG',
-        'model_identifier': None,
-        'system_prompt': None,
-        'user_prompt_template': None,
-        'temperature': 0.7,
-        'max_tokens': None,
-        'caching_enabled': True,
-        'caching_force_reprocess_all': False
+        'log_file': str(tmp_path / 'test_app.log')
     }
 
 @pytest.fixture
@@ -48,6 +54,24 @@ def mock_dependencies(mocker, mock_config_valid):
     # unless specific error conditions for these need to be simulated.
     return m_load_config, m_call_api
 
+def _expected_api_call(content: str, config: dict):
+    """The call_llm_api call process_directory makes for one file with the defaults of mock_config_valid."""
+    return call(
+        content,
+        config['api_url'],
+        config['type'],
+        config['api_key'],
+        timeout=60,
+        model_identifier=None,
+        system_prompt=None,
+        user_prompt_template=None,
+        temperature=0.7,
+        max_tokens=None,
+        context_length=8192,
+        use_cache=False,
+        refresh_cache=False
+    )
+
 def create_dummy_files(input_dir_path: Path, num_files: int, subdirs: bool = False):
     """Helper to create dummy .txt files."""
     files_created = []
@@ -65,7 +89,6 @@ def create_dummy_files(input_dir_path: Path, num_files: int, subdirs: bool = Fal
 
 def test_process_directory_success(tmp_path, mock_dependencies, mock_config_valid, caplog, mocker): # Added mocker
     """Test successful processing of directory with .txt files."""
-    caplog.set_level(logging.INFO)
     m_load_config, m_call_api = mock_dependencies
 
     input_dir = Path(mock_config_valid['input_dir'])
@@ -95,34 +118,8 @@ def test_process_directory_success(tmp_path, mock_dependencies, mock_config_vali
     # We check call_count and then inspect individual calls if order is not guaranteed or args vary.
     # For this test, model_identifier, system_prompt, and max_tokens are None from mock_config_valid.
 
-    calls = [
-        mocker.call(
-            "Content file1", 
-            mock_config_valid['api_url'], 
-            mock_config_valid['type'],
-            mock_config_valid['api_key'], 
-            timeout=60, 
-            model_identifier=None,
-            system_prompt=None,
-            user_prompt_template=None,
-            temperature=0.7,
-            max_tokens=None,
-            context_length=8192
-        ),
-        mocker.call(
-            "Content file2", 
-            mock_config_valid['api_url'], 
-            mock_config_valid['type'],
-            mock_config_valid['api_key'], 
-            timeout=60, 
-            model_identifier=None,
-            system_prompt=None,
-            user_prompt_template=None,
-            temperature=0.7,
-            max_tokens=None,
-            context_length=8192
-        )
-    ]
+    calls = [_expected_api_call("Content file1", mock_config_valid),
+             _expected_api_call("Content file2", mock_config_valid)]
     m_call_api.assert_has_calls(calls, any_order=True)
 
     # Check output files
@@ -138,7 +135,6 @@ def test_process_directory_success(tmp_path, mock_dependencies, mock_config_vali
 
 def test_process_directory_no_txt_files(tmp_path, mock_dependencies, mock_config_valid, caplog):
     """Test behavior when no .txt files are found."""
-    caplog.set_level(logging.INFO)
     m_load_config, m_call_api = mock_dependencies
 
     # No dummy files created in input_dir
@@ -152,7 +148,6 @@ def test_process_directory_no_txt_files(tmp_path, mock_dependencies, mock_config
 
 def test_process_directory_api_failure(tmp_path, mock_dependencies, mock_config_valid, caplog):
     """Test behavior when API call fails for a file."""
-    caplog.set_level(logging.INFO) # Changed to INFO to capture "Processing complete."
     m_load_config, m_call_api = mock_dependencies
     m_call_api.return_value = None # Simulate API failure
 
@@ -175,7 +170,9 @@ def test_process_directory_api_failure(tmp_path, mock_dependencies, mock_config_
         user_prompt_template=None,
         temperature=0.7,
         max_tokens=None,
-        context_length=8192
+        context_length=8192,
+        use_cache=False,
+        refresh_cache=False
     )
 
     output_file1 = output_dir / "error_file.md"
@@ -196,7 +193,8 @@ def test_process_directory_input_dir_not_found(tmp_path, mocker, caplog):
         'log_file': str(tmp_path / 'test_app.log'), 'log_level': 'DEBUG',
         'model_identifier': None,
         'caching_enabled': True,
-        'caching_force_reprocess_all': False
+        'caching_force_reprocess_all': False,
+        'caching_response_cache': True
     }
     mocker.patch('src.main.load_config', return_value=mock_config_non_existent_input)
     m_call_api = mocker.patch('src.main.call_llm_api') # Still need to mock this
@@ -208,28 +206,15 @@ def test_process_directory_input_dir_not_found(tmp_path, mocker, caplog):
 
 def test_process_directory_read_error(tmp_path, mock_dependencies, mock_config_valid, mocker, caplog):
     """Test behavior when reading an input file fails."""
-    caplog.set_level(logging.INFO) # Changed to INFO to capture "Processing complete."
     m_load_config, m_call_api = mock_dependencies
 
     input_dir = Path(mock_config_valid['input_dir'])
     file_path = input_dir / "read_error.txt"
     file_path.write_text("Initial content") # File exists
 
-    # Mock open to raise IOError for this specific file when read
-    # This is a bit more involved; need to mock Path.open or the global open
-    # For simplicity, let's mock Path.read_text which is used by main.py's open() context manager
-    # Actually, main.py uses `with open(file_path, 'r', encoding='utf-8') as f: file_content = f.read()`
-    # So we mock `builtins.open`
-
-    original_open = open
-    def mock_open_with_read_error(path, *args, **kwargs):
-        if str(path) == str(file_path): # Only for the target file
-            m = mocker.mock_open(mocker.MagicMock(spec=open))
-            m.return_value.read.side_effect = IOError("Cannot read this file")
-            return m()
-        return original_open(path, *args, **kwargs) # Use real open for other files (e.g. config)
-
-    mocker.patch('builtins.open', mock_open_with_read_error)
+    # Only the open() calls made in src.main are intercepted (create=True shadows
+    # the builtin in the module namespace), so logging and pytest keep the real one.
+    mocker.patch('src.main.open', create=True, side_effect=IOError("Cannot read this file"))
 
     process_directory()
 
@@ -245,8 +230,6 @@ def test_process_directory_read_error(tmp_path, mock_dependencies, mock_config_v
 
 def test_main_passes_timeout_to_api_handler(tmp_path, mocker, caplog):
     """Test that process_directory passes the configured api_timeout to call_llm_api."""
-    caplog.set_level(logging.INFO)
-
     custom_timeout = 180
     input_dir = tmp_path / "input_timeout_test"
     output_dir = tmp_path / "output_timeout_test"
@@ -268,7 +251,8 @@ def test_main_passes_timeout_to_api_handler(tmp_path, mocker, caplog):
         'temperature': 0.7,
         'max_tokens': None,
         'caching_enabled': True,
-        'caching_force_reprocess_all': False
+        'caching_force_reprocess_all': False,
+        'caching_response_cache': True
     }
 
     m_load_config = mocker.patch('src.main.load_config', return_value=mock_config_with_custom_timeout)
@@ -295,7 +279,9 @@ def test_main_passes_timeout_to_api_handler(tmp_path, mocker, caplog):
         user_prompt_template=None,
         temperature=0.7,
         max_tokens=None,
-        context_length=8192
+        context_length=8192,
+        use_cache=False,
+        refresh_cache=False
     )
 
     # Check that the output file was created
@@ -305,183 +291,365 @@ def test_main_passes_timeout_to_api_handler(tmp_path, mocker, caplog):
     assert "Processing complete." in caplog.text
 
 
-# --- Caching Logic Tests ---
-# Using unittest.mock for more granular control over Path objects if needed,
-# but pytest-mock (mocker) should largely suffice.
-from unittest.mock import MagicMock, mock_open as unittest_mock_open
+def test_process_directory_response_cache_at_zero_temperature(tmp_path, mock_dependencies, mock_config_valid, mocker):
+    """Test that the response cache is opened and used only at temperature 0."""
+    m_load_config, m_call_api = mock_dependencies
+    m_open_cache = mocker.patch('src.main.llm_cache.open_cache')
+    m_close_cache = mocker.patch('src.main.llm_cache.close_cache')
+    mock_config_valid['caching_response_cache'] = True
+    mock_config_valid['caching_response_cache_file'] = str(tmp_path / 'responses.sqlite3')
+    (Path(mock_config_valid['input_dir']) / "file1.txt").write_text("Content file1")
+
+    process_directory() # temperature 0.7: cache not used
+    m_open_cache.assert_not_called()
+    assert m_call_api.call_args.kwargs['use_cache'] is False
+
+    mock_config_valid['temperature'] = 0
+    mock_config_valid['caching_enabled'] = False # Reprocess, the output from the first run exists
+    process_directory() # caching disabled: cache not used either
+    m_open_cache.assert_not_called()
+
+    mock_config_valid['caching_force_reprocess_all'] = True
+    mock_config_valid['caching_enabled'] = True
+    process_directory()
+    m_open_cache.assert_called_once_with(str(tmp_path / 'responses.sqlite3'))
+    assert m_call_api.call_args.kwargs['use_cache'] is True
+    assert m_call_api.call_args.kwargs['refresh_cache'] is True
+    assert m_close_cache.call_count == 3
 
-class TestCachingLogic:
-    @pytest.fixture(autouse=True)
-    def common_mocks(self, mocker): # Add mocker here explicitly
-        self.m_load_config = mocker.patch('src.main.load_config')
-        self.m_call_api = mocker.patch('src.main.call_llm_api', return_value="## Mocked Markdown")
+def test_process_directory_runs_api_calls_concurrently(tmp_path, mock_dependencies, mock_config_valid, caplog):
+    """Test that up to max_concurrency files are converted at the same time and all are counted."""
+    m_load_config, m_call_api = mock_dependencies
+    mock_config_valid['max_concurrency'] = 2
+    create_dummy_files(Path(mock_config_valid['input_dir']), 6, subdirs=True)
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    def slow_call(*args, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return "## Mocked Markdown"
+    m_call_api.side_effect = slow_call
 
-        # Mock Path methods that are used in process_directory
-        self.m_path_class = mocker.patch('src.main.Path', autospec=True)
+    process_directory()
 
-        # Configure the mock Path class to handle path-like operations and specific method calls
-        # This setup makes self.m_path_class behave like the Path class for instantiation
-        # and allows mocking instance methods on the results of Path(...) calls.
+    assert m_call_api.call_count == 6
+    assert peak == 2
+    assert "Summary: 6 files processed, 0 files skipped (up-to-date), 0 files failed" in caplog.text
 
-        # Mock for input_dir_path.rglob, input_file_path.relative_to, input_file_path.stat
-        # output_dir_path.mkdir, output_file_path.exists, output_file_path.stat, output_file_path.parent.mkdir
+def test_process_directory_reports_connection_error(tmp_path, mock_dependencies, mock_config_valid, caplog):
+    """Test that API failures are counted and trigger the connection error hint."""
+    m_load_config, m_call_api = mock_dependencies
+    m_call_api.return_value = None
+    create_dummy_files(Path(mock_config_valid['input_dir']), 3)
 
-        # Default input file
-        self.mock_input_file = MagicMock(spec=Path)
-        self.mock_input_file.name = "sample1.txt"
-        self.mock_input_file.__str__.return_value = "fake_input/sample1.txt" # for logging
+    process_directory()
 
-        # Mock rglob to return a list containing our mock input file
-        self.m_path_class.return_value.rglob.return_value = [self.mock_input_file]
+    assert "Summary: 0 files processed, 0 files skipped (up-to-date), 3 files failed" in caplog.text
+    assert "CONNECTION ERROR: Unable to reach LM Studio API" in caplog.text
 
-        # Mock relative_to to return a new mock Path object for the relative path
-        # This relative path object then needs a with_suffix method
-        mock_relative_path = MagicMock(spec=Path)
-        mock_relative_path.with_suffix.return_value = Path("sample1.md") # Path for joining
-        self.mock_input_file.relative_to.return_value = mock_relative_path
+def test_process_directory_asyncio_mode(tmp_path, mock_dependencies, mock_config_valid, mocker, caplog):
+    """Test that use_asyncio converts the files via acall_llm_api with one shared client."""
+    m_load_config, m_call_api = mock_dependencies
+    m_acall_api = mocker.patch('src.main.acall_llm_api', new_callable=mocker.AsyncMock, return_value="## Async Markdown")
+    mock_config_valid['use_asyncio'] = True
+    input_dir = Path(mock_config_valid['input_dir'])
+    output_dir = Path(mock_config_valid['output_dir'])
+    create_dummy_files(input_dir, 3, subdirs=True)
 
-        # Mock stat results for input and output files (can be overridden per test)
-        self.mock_input_file_stat = MagicMock()
-        self.mock_input_file.stat.return_value = self.mock_input_file_stat
+    process_directory()
 
-        self.mock_output_file_stat = MagicMock()
-        # We need to ensure that when Path('fake_output/sample1.md') is created,
-        # its stat() method returns self.mock_output_file_stat.
-        # This requires a bit more sophisticated Path mock.
+    m_call_api.assert_not_called()
+    assert m_acall_api.await_count == 3
+    clients = {call.kwargs['client'] for call in m_acall_api.await_args_list}
+    assert len(clients) == 1
+    assert (output_dir / "subdir0" / "sample1.md").read_text() == "## Async Markdown"
+    assert (output_dir / "sample2.md").read_text() == "## Async Markdown"
+    assert "Summary: 3 files processed, 0 files skipped (up-to-date), 0 files failed" in caplog.text
+
+def test_process_directory_asyncio_reads_inputs_within_concurrency_limit(tmp_path, mock_dependencies, mock_config_valid, mocker):
+    """Test that use_asyncio reads a file only once it may be sent, not the whole input tree up front."""
+    m_load_config, m_call_api = mock_dependencies
+    mock_config_valid['use_asyncio'] = True
+    mock_config_valid['max_concurrency'] = 2
+    create_dummy_files(Path(mock_config_valid['input_dir']), 8)
+    read_spy = mocker.spy(src_main, '_read_input')
+    reads_before_call = []
 
-        # Let Path() constructor return a mock that can then have specific methods like
-        # exists(), stat(), mkdir() mocked.
-        # The instance returned by Path() will be used for input_dir_path, output_dir_path, etc.
+    async def fake_acall(*args, **kwargs):
+        reads_before_call.append(read_spy.call_count)
+        return "## Async Markdown"
+    mocker.patch('src.main.acall_llm_api', side_effect=fake_acall)
 
-        self.mock_path_instance = self.m_path_class.return_value
-        self.mock_path_instance.is_dir.return_value = True # for input_dir_path.is_dir()
-        self.mock_path_instance.mkdir.return_value = None # for output_dir_path.mkdir()
+    process_directory()
 
-        # Specific mock for output_file_path object
-        self.mock_output_file_path_obj = MagicMock(spec=Path)
-        self.mock_output_file_path_obj.name = "sample1.md" # for logging
-        self.mock_output_file_path_obj.__str__.return_value = "fake_output/sample1.md"
-        self.mock_output_file_path_obj.stat.return_value = self.mock_output_file_stat
+    assert read_spy.call_count == 8
+    assert reads_before_call[0] <= 2
 
-        # Ensure that when output_dir_path / "relative.md" is called, it returns self.mock_output_file_path_obj
-        # This means the __truediv__ method of the mock_path_instance needs to be configured.
-        self.mock_path_instance.__truediv__.return_value = self.mock_output_file_path_obj
+def test_api_arguments_built_once_per_run(tmp_path, mock_dependencies, mock_config_valid, mocker):
+    """Test that the per-call API settings are read from the config once, not per file."""
+    m_load_config, m_call_api = mock_dependencies
+    spy = mocker.spy(src_main, '_api_arguments')
+    create_dummy_files(Path(mock_config_valid['input_dir']), 3)
 
-        # Mock for output_file_path.parent.mkdir()
-        mock_output_parent_dir = MagicMock(spec=Path)
-        mock_output_parent_dir.mkdir.return_value = None
-        self.mock_output_file_path_obj.parent = mock_output_parent_dir
+    process_directory()
 
-        # Mock open for reading input and writing output
-        self.m_open = mocker.patch('builtins.open', unittest_mock_open())
+    assert m_call_api.call_count == 3
+    assert spy.call_count == 1
 
+def test_content_manifest_skips_touched_but_unchanged_files(tmp_path, mock_dependencies, mock_config_valid, caplog):
+    """Test that with content_manifest a new mtime alone does not trigger another API call."""
+    m_load_config, m_call_api = mock_dependencies
+    mock_config_valid['caching_content_manifest'] = True
+    output_dir = Path(mock_config_valid['output_dir'])
+    unchanged, edited = create_dummy_files(Path(mock_config_valid['input_dir']), 2)
 
-    def _run_process_directory(self, config_override):
-        base_config = {
-            'input_dir': 'fake_input',
-            'output_dir': 'fake_output',
-            'api_url': 'fake_api_url',
-            'api_key': None,
-            'api_timeout': 60,
-            'model_identifier': None, # Added to base_config for completeness
-            'type': 'lmstudio',  # Added for server type
-            'context_length': 8192,  # Added context length
-            # Default logging setup for tests, actual log content not primary focus here
-            'log_file': 'test_cache.log',
-            'log_level': 'DEBUG'
-        }
-        # config_override might change caching_enabled, caching_force_reprocess_all, or model_identifier
-        current_config = {**base_config, **config_override}
-        # Ensure caching flags are present if not in override, using defaults from base_config or new ones
-        current_config.setdefault('caching_enabled', True)
-        current_config.setdefault('caching_force_reprocess_all', False)
+    process_directory()
+    assert m_call_api.call_count == 2
+    assert (output_dir / ".manifest.json").exists()
 
-        self.m_load_config.return_value = current_config
-        process_directory()
+    # Both inputs become newer than their outputs, only one changes its content
+    os.utime(output_dir / "sample1.md", (1000, 1000))
+    os.utime(output_dir / "sample2.md", (1000, 1000))
+    edited.write_text("Edited content")
+    m_call_api.reset_mock()
 
-    # Scenario 1: Standard Caching (enabled=True, force_reprocess_all=False)
-    def test_std_caching_output_newer_skips(self, caplog):
-        caplog.set_level(logging.INFO)
-        self.mock_input_file_stat.st_mtime = 1000 # Input older
-        self.mock_output_file_stat.st_mtime = 2000 # Output newer
-        self.mock_output_file_path_obj.exists.return_value = True
+    process_directory()
 
-        self._run_process_directory({
-            'caching_enabled': True,
-            'caching_force_reprocess_all': False,
-            'model_identifier': 'test-skip-model' # Can be specific for test if needed
-        })
+    m_call_api.assert_called_once()
+    assert m_call_api.call_args.args[0] == "Edited content"
+    assert f"Skipping (content unchanged): {unchanged}" in caplog.text
+    assert "Summary: 1 files processed, 1 files skipped (up-to-date), 0 files failed" in caplog.text
+
+@pytest.mark.parametrize("forced_run", [
+    {'caching_force_reprocess_all': True},
+    {'caching_enabled': False},
+], ids=["force_reprocess_all", "caching_disabled"])
+def test_content_manifest_forgets_files_converted_without_hashing(tmp_path, mock_dependencies, mock_config_valid, forced_run):
+    """Test that a run that converts files without the manifest check does not leave stale digests behind."""
+    m_load_config, m_call_api = mock_dependencies
+    mock_config_valid['caching_content_manifest'] = True
+    output_dir = Path(mock_config_valid['output_dir'])
+    (input_file,) = create_dummy_files(Path(mock_config_valid['input_dir']), 1)
+    original_content = input_file.read_text()
 
-        self.m_call_api.assert_not_called()
-        assert "Skipping (up-to-date): fake_input/sample1.txt -> fake_output/sample1.md" in caplog.text
+    process_directory()
 
-    def test_std_caching_output_older_processes(self, caplog):
-        caplog.set_level(logging.INFO)
-        self.mock_input_file_stat.st_mtime = 2000 # Input newer
-        self.mock_output_file_stat.st_mtime = 1000 # Output older
-        self.mock_output_file_path_obj.exists.return_value = True
+    # Converted from other content by a run that does not hash its inputs
+    input_file.write_text("Other content")
+    m_load_config.return_value = {**mock_config_valid, **forced_run}
+    process_directory()
 
-        self._run_process_directory({
-            'caching_enabled': True,
-            'caching_force_reprocess_all': False,
-            'model_identifier': 'test-process-older-model'
-        })
+    # Back to the content of the first run, and newer than the output again
+    input_file.write_text(original_content)
+    os.utime(output_dir / "sample1.md", (1000, 1000))
+    m_load_config.return_value = mock_config_valid
+    m_call_api.reset_mock()
+    process_directory()
 
-        self.m_call_api.assert_called_once()
-        # Verify model_identifier was passed to the mock_call_api
-        args, kwargs = self.m_call_api.call_args
-        assert kwargs.get('model_identifier') == 'test-process-older-model'
-        assert "Processing (output older): fake_input/sample1.txt -> fake_output/sample1.md" in caplog.text
+    m_call_api.assert_called_once()
+    assert m_call_api.call_args.args[0] == original_content
 
-    def test_std_caching_output_missing_processes(self, caplog):
-        caplog.set_level(logging.INFO)
-        self.mock_output_file_path_obj.exists.return_value = False
-        # st_mtime for input doesn't matter if output is missing, API should be called
+def test_process_directory_batch_mode(tmp_path, mock_dependencies, mock_config_valid, mocker, caplog):
+    """Test that batch_size groups the files into call_llm_api_batch requests."""
+    m_load_config, m_call_api = mock_dependencies
+    def fake_batch(texts, api_url, server_type, batch_size, **kwargs):
+        for index, text_content in enumerate(texts):
+            yield index, None if text_content.endswith("sample2.txt") else f"## {text_content}"
+    m_call_batch = mocker.patch('src.main.call_llm_api_batch', side_effect=fake_batch)
+    mock_config_valid['batch_size'] = 2
+    output_dir = Path(mock_config_valid['output_dir'])
+    create_dummy_files(Path(mock_config_valid['input_dir']), 3)
 
-        self._run_process_directory({
-            'caching_enabled': True,
-            'caching_force_reprocess_all': False,
-            'model_identifier': 'test-process-missing-model'
-        })
+    process_directory()
 
-        self.m_call_api.assert_called_once()
-        args, kwargs = self.m_call_api.call_args
-        assert kwargs.get('model_identifier') == 'test-process-missing-model'
-        assert "Processing (output missing): fake_output/sample1.md for input fake_input/sample1.txt" in caplog.text
+    m_call_api.assert_not_called()
+    assert sorted(len(call.args[0]) for call in m_call_batch.call_args_list) == [1, 2]
+    assert (output_dir / "sample1.md").read_text() == "## Content of sample1.txt"
+    assert (output_dir / "sample3.md").read_text() == "## Content of sample3.txt"
+    assert not (output_dir / "sample2.md").exists()
+    assert "Summary: 2 files processed, 0 files skipped (up-to-date), 1 files failed" in caplog.text
+
+def test_iter_txt_files_finds_nested_txt_files(tmp_path):
+    """Test that the scandir walker finds .txt files at any depth and nothing else."""
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "top.txt").write_text("x")
+    (tmp_path / "a" / "mid.txt").write_text("x")
+    (tmp_path / "a" / "b" / "deep.txt").write_text("x")
+    (tmp_path / "a" / "notes.md").write_text("x")
+    (tmp_path / "dir.txt").mkdir() # A directory named like a .txt file is not yielded
+
+    found = sorted(iter_txt_files(str(tmp_path)))
+
+    assert found == sorted(str(tmp_path / p) for p in ("top.txt", "a/mid.txt", "a/b/deep.txt"))
+
+def test_output_path_mirrors_input_tree(tmp_path, caplog):
+    """Test the output path derivation, including the fallback for files outside the input directory."""
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
 
-    # Scenario 2: Caching Disabled (enabled=False, force_reprocess_all=False)
-    def test_caching_disabled_processes_even_if_output_newer(self, caplog):
-        caplog.set_level(logging.INFO)
-        self.mock_input_file_stat.st_mtime = 1000 # Input older
-        self.mock_output_file_stat.st_mtime = 2000 # Output newer
-        self.mock_output_file_path_obj.exists.return_value = True # Output exists and is newer
+    nested = _output_path_for(str(input_dir / "sub" / "notes.v2.txt"), input_dir, output_dir)
+    outside = _output_path_for(str(tmp_path / "elsewhere" / "other.txt"), input_dir, output_dir)
 
-        self._run_process_directory({
-            'caching_enabled': False,
-            'caching_force_reprocess_all': False,
-            'model_identifier': 'test-disabled-cache-model'
-        })
+    assert nested == output_dir / "sub" / "notes.v2.md"
+    assert outside == output_dir / "other.md"
+    assert "Using fallback name" in caplog.text
+
+def test_up_to_date_files_never_reach_the_workers(tmp_path, mock_dependencies, mock_config_valid, mocker, caplog):
+    """Test that the planning pass filters out up-to-date files before the worker pool starts."""
+    m_load_config, m_call_api = mock_dependencies
+    m_process_one = mocker.patch('src.main.process_one', wraps=src_main.process_one)
+    input_dir = Path(mock_config_valid['input_dir'])
+    output_dir = Path(mock_config_valid['output_dir'])
+    create_dummy_files(input_dir, 3)
+    (output_dir / "sample1.md").write_text("## Up-to-date")
+    os.utime(input_dir / "sample1.txt", (1000, 1000))
+
+    process_directory()
+
+    assert m_process_one.call_count == 2
+    assert {call.args[0] for call in m_process_one.call_args_list} == {str(input_dir / "sample2.txt"), str(input_dir / "sample3.txt")}
+    assert "Summary: 2 files processed, 1 files skipped (up-to-date), 0 files failed" in caplog.text
+
+def test_create_output_dirs_once_per_directory(tmp_path, mocker):
+    """Test that each output subdirectory is created once, however many files it receives."""
+    out = tmp_path / "out"
+    jobs = [("a.txt", out / "a.md"), ("b.txt", out / "b.md"), ("c.txt", out / "sub" / "deep" / "c.md")]
+    mock_mkdir = mocker.patch.object(Path, 'mkdir', autospec=True)
+
+    create_output_dirs(jobs)
+
+    assert [c.args[0] for c in mock_mkdir.call_args_list] == [out, out / "sub" / "deep"]
+
+def test_write_output_replaces_file_atomically(tmp_path, caplog):
+    """Test that output is written via a temporary file that replaces the target."""
+    output_file = tmp_path / "out" / "doc.md"
+    output_file.parent.mkdir()
+    output_file.write_text("old")
+
+    assert src_main._write_output(output_file, "# Neu \u00fcber\n") == src_main.FileResult('processed')
+    assert output_file.read_text(encoding='utf-8') == "# Neu \u00fcber\n"
+    assert os.listdir(output_file.parent) == ["doc.md"]
+
+def test_write_output_failure_keeps_existing_file(tmp_path, mocker, caplog):
+    """Test that a failed write leaves the previous output and no temporary file behind."""
+    output_file = tmp_path / "doc.md"
+    output_file.write_text("old")
+    mocker.patch('src.main.os.replace', side_effect=OSError("disk full"))
+
+    assert src_main._write_output(output_file, "new") == src_main.FileResult('failed')
+    assert output_file.read_text() == "old"
+    assert os.listdir(tmp_path) == ["doc.md"]
+    assert f"Error writing Markdown file {output_file}" in caplog.text
+
+def test_read_input_matches_text_mode(tmp_path, caplog):
+    """Test that input files decode like a text-mode read, and undecodable files are reported."""
+    mixed = tmp_path / "mixed.txt"
+    mixed.write_bytes("Zeile 1\r\nZeile 2\rZeile 3\n\u00e4\u00f6\u00fc".encode('utf-8'))
+    broken = tmp_path / "broken.txt"
+    broken.write_bytes(b"\xff\xfe not utf-8")
+
+    with open(mixed, 'r', encoding='utf-8') as f:
+        assert src_main._read_input(str(mixed)) == f.read()
+    assert src_main._read_input(str(broken)) is None
+    assert f"Error reading file {broken}" in caplog.text
+
+# --- Caching Logic Tests ---
+# These use real files in tmp_path; os.utime sets the modification times to compare.
+
+class TestCachingLogic:
+    @pytest.fixture(autouse=True)
+    def common_mocks(self, mocker, tmp_path):
+        self.m_load_config = mocker.patch('src.main.load_config')
+        self.m_call_api = mocker.patch('src.main.call_llm_api', return_value="## Mocked Markdown")
+
+        self.input_dir = tmp_path / "fake_input"
+        self.output_dir = tmp_path / "fake_output"
+        self.input_dir.mkdir()
+        self.output_dir.mkdir()
+
+        # Default input file, with a not yet existing output file
+        self.input_file = self.input_dir / "sample1.txt"
+        self.input_file.write_text("Content of sample1.txt")
+        self.output_file = self.output_dir / "sample1.md"
+
+    def _set_mtimes(self, input_mtime, output_mtime):
+        """Creates the output file and sets the modification times of input and output."""
+        self.output_file.write_text("## Previous Markdown")
+        os.utime(self.input_file, (input_mtime, input_mtime))
+        os.utime(self.output_file, (output_mtime, output_mtime))
+
+    # The settings of every caching test, apart from the tmp_path directories and each test's overrides
+    BASE_CONFIG = MappingProxyType({
+        'api_url': 'fake_api_url',
+        'api_key': None,
+        'api_timeout': 60,
+        'model_identifier': None,
+        'type': 'lmstudio',
+        'context_length': 8192,
+        # Default logging setup for tests, actual log content not primary focus here
+        'log_file': 'test_cache.log',
+        'log_level': 'DEBUG',
+        'caching_enabled': True,
+        'caching_force_reprocess_all': False,
+        'caching_response_cache': True # Not used at the default temperature of 0.7
+    })
+
+    def _run_process_directory(self, config_override):
+        # config_override might change caching_enabled, caching_force_reprocess_all, or model_identifier
+        current_config = {
+            **self.BASE_CONFIG,
+            'input_dir': str(self.input_dir),
+            'output_dir': str(self.output_dir),
+            **config_override
+        }
+        self.m_load_config.return_value = current_config
+        process_directory()
+
+    # Scenario 1: Standard Caching (enabled=True, force_reprocess_all=False)
+    def test_std_caching_compares_nanosecond_mtimes(self, caplog):
+        self._set_mtimes(input_mtime=0, output_mtime=0)
+        # 1 ns apart: identical once converted to float seconds
+        os.utime(self.output_file, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+        os.utime(self.input_file, ns=(1_700_000_000_000_000_001, 1_700_000_000_000_000_001))
+
+        self._run_process_directory({'caching_enabled': True, 'caching_force_reprocess_all': False})
 
         self.m_call_api.assert_called_once()
-        args, kwargs = self.m_call_api.call_args
-        assert kwargs.get('model_identifier') == 'test-disabled-cache-model'
-        assert "Processing (caching disabled): fake_input/sample1.txt" in caplog.text
-
-    # Scenario 3: Force Reprocess (enabled=True, force_reprocess_all=True)
-    # Note: enabled flag could be False as well, force_reprocess_all should take precedence.
-    def test_force_reprocess_processes_even_if_output_newer(self, caplog):
-        caplog.set_level(logging.INFO)
-        self.mock_input_file_stat.st_mtime = 1000 # Input older
-        self.mock_output_file_stat.st_mtime = 2000 # Output newer
-        self.mock_output_file_path_obj.exists.return_value = True # Output exists and is newer
+        assert f"Processing (output older): {self.input_file} -> {self.output_file}" in caplog.text
+
+    # (input mtime, output mtime, caching_enabled, force_reprocess_all, API called, expected log line);
+    # an output mtime of None means the output file does not exist yet.
+    # force_reprocess_all takes precedence over caching_enabled.
+    @pytest.mark.parametrize("input_mtime, output_mtime, enabled, force, expect_call, expected_log", [
+        (1000, 2000, True, False, False, "Skipping (up-to-date): {input} -> {output}"),
+        (2000, 1000, True, False, True, "Processing (output older): {input} -> {output}"),
+        (None, None, True, False, True, "Processing (output missing): {output} for input {input}"),
+        (1000, 2000, False, False, True, "Processing (caching disabled): {input}"),
+        (1000, 2000, True, True, True, "Processing (forced by force_reprocess_all): {input}"),
+    ], ids=["std_output_newer_skips", "std_output_older_processes", "std_output_missing_processes",
+            "disabled_processes_even_if_output_newer", "force_reprocess_processes_even_if_output_newer"])
+    def test_caching_scenarios(self, caplog, input_mtime, output_mtime, enabled, force, expect_call, expected_log):
+        if output_mtime is not None:
+            self._set_mtimes(input_mtime=input_mtime, output_mtime=output_mtime)
 
         self._run_process_directory({
-            'caching_enabled': True, # Could be False too
-            'caching_force_reprocess_all': True,
-            'model_identifier': 'test-force-reprocess-model'
+            'caching_enabled': enabled,
+            'caching_force_reprocess_all': force,
+            'model_identifier': 'test-caching-model'
         })
 
-        self.m_call_api.assert_called_once()
-        args, kwargs = self.m_call_api.call_args
-        assert kwargs.get('model_identifier') == 'test-force-reprocess-model'
-        assert "Processing (forced by force_reprocess_all): fake_input/sample1.txt" in caplog.text
+        assert expected_log.format(input=self.input_file, output=self.output_file) in caplog.text
+        if expect_call:
+            self.m_call_api.assert_called_once()
+            assert self.m_call_api.call_args.kwargs.get('model_identifier') == 'test-caching-model'
+            assert self.output_file.read_text() == "## Mocked Markdown"
+        else:
+            self.m_call_api.assert_not_called()
+            assert self.output_file.read_text() == "## Previous Markdown"